@@ -0,0 +1,247 @@
+"""
+Инкрементальные агрегаты для /stats.
+
+Эндпоинты записи вызывают функции record_* в той же транзакции, что и
+изменение данных. rebuild_aggregates пересчитывает таблицы из сырых данных:
+
+    python -m app.aggregates            # пересчитать
+    python -m app.aggregates --check    # только найти расхождения
+    python -m app.aggregates --dedupe-checkins  # убрать дубли отметок и пересчитать
+"""
+
+import argparse
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Integer, cast, delete, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Checkin, Habit, HabitStats, User, UserStats, dedupe_checkins
+from .versioning import stage_version
+
+# INSERT ... ON CONFLICT DO UPDATE для поддерживаемых СУБД
+UPSERT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+# Изменения счетчиков отметок по привычкам: {habit_id: (total, completed)}
+CheckinDeltas = Dict[int, Tuple[int, int]]
+
+
+def _upsert_counters(db: AsyncSession, model, key: dict, deltas: dict):
+    """INSERT ... ON CONFLICT, прибавляющий deltas к счетчикам строки"""
+    upsert = UPSERT_INSERTS[db.bind.dialect.name]
+    table = model.__table__
+    stmt = upsert(model).values({**key, **deltas})
+    return stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={column: table.c[column] + delta for column, delta in deltas.items()},
+    )
+
+
+async def _add_habit_counters(
+    db: AsyncSession, habit_id: int, total: int, completed: int
+) -> None:
+    await db.execute(
+        _upsert_counters(
+            db,
+            HabitStats,
+            {"habit_id": habit_id},
+            {"total_checkins": total, "completed_checkins": completed},
+        )
+    )
+
+
+async def _add_user_counters(
+    db: AsyncSession,
+    user_id: int,
+    habits: int = 0,
+    total: int = 0,
+    completed: int = 0,
+) -> None:
+    """Обновляет счетчики пользователя и увеличивает версию его данных"""
+    stmt = _upsert_counters(
+        db,
+        UserStats,
+        {"user_id": user_id},
+        {
+            "total_habits": habits,
+            "total_checkins": total,
+            "completed_checkins": completed,
+            "data_version": 1,
+        },
+    )
+    version = await db.scalar(stmt.returning(UserStats.data_version))
+    stage_version(db, user_id, version)
+
+
+async def record_user_write(db: AsyncSession, user_id: int) -> None:
+    """Запись без изменения счетчиков: только новая версия данных"""
+    await _add_user_counters(db, user_id)
+
+
+async def record_habit_created(db: AsyncSession, user_id: int) -> None:
+    await _add_user_counters(db, user_id, habits=1)
+
+
+async def record_habit_deleted(db: AsyncSession, user_id: int, habit_id: int) -> None:
+    """Вычитает привычку и все ее отметки из агрегатов пользователя"""
+    result = await db.execute(
+        delete(HabitStats)
+        .where(HabitStats.habit_id == habit_id)
+        .returning(HabitStats.total_checkins, HabitStats.completed_checkins)
+    )
+    total, completed = result.first() or (0, 0)
+
+    await _add_user_counters(db, user_id, habits=-1, total=-total, completed=-completed)
+
+
+async def record_checkins(
+    db: AsyncSession, user_id: int, deltas: CheckinDeltas
+) -> None:
+    """Применяет изменения счетчиков отметок к привычкам и пользователю"""
+    for habit_id, (total, completed) in deltas.items():
+        if (total, completed) != (0, 0):
+            await _add_habit_counters(db, habit_id, total, completed)
+
+    await _add_user_counters(
+        db,
+        user_id,
+        total=sum(total for total, _ in deltas.values()),
+        completed=sum(done for _, done in deltas.values()),
+    )
+
+
+def _computed_habit_stats():
+    return select(
+        Checkin.habit_id,
+        func.count(Checkin.id),
+        func.coalesce(func.sum(cast(Checkin.completed, Integer)), 0),
+    ).group_by(Checkin.habit_id)
+
+
+def _computed_user_stats():
+    # От users, а не от habits: строку с новой версией данных получает и
+    # пользователь без привычек, иначе его версия начнется заново с 0
+    return (
+        select(
+            User.id,
+            func.count(func.distinct(Habit.id)),
+            func.count(Checkin.id),
+            func.coalesce(func.sum(cast(Checkin.completed, Integer)), 0),
+        )
+        .outerjoin(Habit, Habit.user_id == User.id)
+        .outerjoin(Checkin, Checkin.habit_id == Habit.id)
+        .group_by(User.id)
+    )
+
+
+def rebuild_aggregates(connection) -> None:
+    """
+    Пересчитывает user_stats и habit_stats из habits и checkins.
+    Новая версия данных больше любой прежней, чтобы старые ETag не совпали.
+    """
+    next_version = connection.scalar(select(func.max(UserStats.data_version)))
+    next_version = (next_version or 0) + 1
+
+    connection.execute(delete(HabitStats))
+    connection.execute(delete(UserStats))
+    connection.execute(
+        insert(HabitStats).from_select(
+            ["habit_id", "total_checkins", "completed_checkins"],
+            _computed_habit_stats(),
+        )
+    )
+    connection.execute(
+        insert(UserStats).from_select(
+            [
+                "user_id",
+                "total_habits",
+                "total_checkins",
+                "completed_checkins",
+                "data_version",
+            ],
+            _computed_user_stats().add_columns(literal(next_version)),
+        )
+    )
+
+
+def find_drift(connection) -> List[str]:
+    """Возвращает описания расхождений агрегатов с сырыми данными"""
+    drift = []
+    checks = [
+        (
+            "habit",
+            _computed_habit_stats(),
+            select(
+                HabitStats.habit_id,
+                HabitStats.total_checkins,
+                HabitStats.completed_checkins,
+            ),
+        ),
+        (
+            "user",
+            _computed_user_stats(),
+            select(
+                UserStats.user_id,
+                UserStats.total_habits,
+                UserStats.total_checkins,
+                UserStats.completed_checkins,
+            ),
+        ),
+    ]
+    for name, computed_query, stored_query in checks:
+        computed = {
+            row[0]: tuple(row[1:]) for row in connection.execute(computed_query)
+        }
+        stored = {row[0]: tuple(row[1:]) for row in connection.execute(stored_query)}
+        # Отсутствующая строка агрегатов эквивалентна нулевым счетчикам
+        zeros = (0,) * (len(stored_query.selected_columns) - 1)
+        for key in sorted(computed.keys() | stored.keys()):
+            expected = computed.get(key, zeros)
+            actual = stored.get(key, zeros)
+            if expected != actual:
+                drift.append(f"{name} {key}: stored={actual} expected={expected}")
+    return drift
+
+
+def ensure_aggregates(connection) -> None:
+    """Заполняет агрегаты для базы, созданной до их появления"""
+    has_aggregates = connection.execute(select(UserStats.user_id).limit(1)).first()
+    has_habits = connection.execute(select(Habit.id).limit(1)).first()
+    if has_habits and not has_aggregates:
+        rebuild_aggregates(connection)
+
+
+def main() -> None:
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Rebuild /stats aggregates")
+    parser.add_argument(
+        "--check", action="store_true", help="only report drift, do not rebuild"
+    )
+    parser.add_argument(
+        "--dedupe-checkins",
+        action="store_true",
+        help="keep the latest checkin per habit and day before rebuilding",
+    )
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        if args.dedupe_checkins:
+            print(f"Duplicate checkins removed: {dedupe_checkins(connection)}")
+
+        drift = find_drift(connection)
+        for line in drift:
+            print(line)
+        print(f"Drifted rows: {len(drift)}")
+
+        if not args.check:
+            rebuild_aggregates(connection)
+            print("Aggregates rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,41 @@
+import hmac
+import logging
 import os
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import get_db
+from .auth_cache import Principal, principal_cache, token_key
+from .database import get_async_db
 from .models import User
+from .password_hashing import password_hasher, pwd_context
+from .structured_log import log_event
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "30"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Ключ для /admin/*; без него админские эндпоинты отключены
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
 security = HTTPBearer()
 
+logger = logging.getLogger(__name__)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    Проверяет совпадение пароля с хешем
-    """
-    return pwd_context.verify(plain_password, hashed_password)
+
+def mask_username(username: str) -> str:
+    return f"{username[:3]}***" if len(username) > 3 else "***"
 
 
 def get_password_hash(password: str) -> str:
     """
-    Создает безопасный хеш пароля
+    Создает безопасный хеш пароля в текущем потоке.
+    Для CLI-утилит и тестов; код на event loop использует password_hasher
     """
     return pwd_context.hash(password)
 
@@ -49,36 +56,60 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def authenticate_user(
+    db: AsyncSession, username: str, password: str
+) -> Optional[User]:
     """
-    Аутентифицирует пользователя с помощью безопасного запроса к БД
+    Аутентифицирует пользователя с помощью безопасного запроса к БД.
+    Проверка bcrypt выполняется в пуле процессов password_hasher.
     """
     # используется ORM - защита от SQL injection
-    user = db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
 
     if not user:
         # Логируем попытку входа несуществующего пользователя
-        print(f"Failed login attempt for non-existent user: {username}")
+        log_event(
+            logger,
+            logging.WARNING,
+            "login_failed",
+            sample=True,
+            reason="unknown_user",
+            username=mask_username(username),
+        )
         return None
 
-    if not verify_password(password, user.password):
+    if not await password_hasher.verify(password, user.password):
         # Логируем неверный пароль
-        masked_username = f"{username[:3]}***" if len(username) > 3 else "***"
-        print(f"Failed login for user: {masked_username}")
+        log_event(
+            logger,
+            logging.WARNING,
+            "login_failed",
+            sample=True,
+            reason="bad_password",
+            username=mask_username(username),
+        )
         return None
 
     # Успешная аутентификация
-    print(f"Successful login for user: {username}")
+    log_event(logger, logging.INFO, "login_succeeded", username=username)
     return user
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db),
-) -> User:
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
     """
-    Извлекает и проверяет текущего пользователя из JWT токена
+    Извлекает и проверяет текущего пользователя из JWT токена.
+    Повторные запросы с тем же токеном обслуживаются из principal_cache
+    без проверки подписи и запроса к БД.
     """
+    cache_key = token_key(credentials.credentials)
+    principal = principal_cache.get(cache_key)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось подтвердить учетные данные",
@@ -96,14 +127,37 @@ def get_current_user(
             raise credentials_exception
 
     except JWTError as e:
-        print(f"JWT decoding error: {e}")
+        log_event(logger, logging.WARNING, "token_invalid", sample=True, error=str(e))
         raise credentials_exception
 
     # безопасно ищем пользователя в БД
-    user = db.query(User).filter(User.username == username).first()
+    result = await db.execute(
+        select(User.id, User.username).where(User.username == username)
+    )
+    user = result.first()
 
     if user is None:
-        print(f"User not found for token: {username}")
+        log_event(
+            logger,
+            logging.WARNING,
+            "token_user_not_found",
+            sample=True,
+            username=mask_username(username),
+        )
         raise credentials_exception
 
-    return user
+    principal = Principal(id=user.id, username=user.username)
+    principal_cache.put(
+        cache_key, principal, token_exp=payload.get("exp", float("inf"))
+    )
+    return principal
+
+
+def require_admin_key(x_api_key: Optional[str] = Header(None)) -> None:
+    """Проверяет API-ключ админских эндпоинтов (заголовок X-API-Key)"""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_api_key is None or not hmac.compare_digest(x_api_key, ADMIN_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid API key"
+        )
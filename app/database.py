@@ -1,24 +1,448 @@
 # database.py
+import logging
 import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from .structured_log import log_event
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/app.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Асинхронные драйверы для бэкендов из DATABASE_URL. Только СУБД с
+# INSERT ... RETURNING и ON CONFLICT (см. aggregates.UPSERT_INSERTS), поэтому
+# MySQL не поддерживается
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
+def make_async_url(database_url: str) -> URL:
+    """
+    Подбирает асинхронный драйвер для URL базы данных.
+    URL с уже асинхронным драйвером возвращается без изменений.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for backend: {backend}")
+
+    if url.get_driver_name() == ASYNC_DRIVERS[backend]:
+        return url
+
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or make_async_url(DATABASE_URL)
+
+# Путь эндпоинтов к БД для A/B под k6: async - AsyncSession и async-драйвер,
+# sync - синхронная Session, каждый запрос к БД в пуле потоков
+DB_SESSION_MODE = os.getenv("DB_SESSION_MODE", "async").lower()
+if DB_SESSION_MODE not in ("async", "sync"):
+    raise ValueError(f"Unknown DB_SESSION_MODE: {DB_SESSION_MODE!r}")
+
+# Профиль производительности SQLite, применяется к каждому новому соединению
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Отрицательное значение - размер кэша в KiB, а не в страницах
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "foreign_keys": "ON" if os.getenv("SQLITE_FOREIGN_KEYS", "1") == "1" else "OFF",
+}
+
+# Журнал медленных запросов: выключен, пока не задан порог
+SLOW_QUERY_THRESHOLD_MS = os.getenv("SLOW_QUERY_THRESHOLD_MS")
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+
+# Размер пула соединений (на каждый движок)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def is_memory_database(database_url) -> bool:
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def pool_options(database_url) -> dict:
+    """
+    Параметры пула для create_engine.
+    In-memory SQLite использует пул из одного соединения без настроек размера.
+    """
+    if is_memory_database(database_url):
+        return {}
+
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+
+class TimedCheckoutPool:
+    """
+    Примесь к классу пула: сообщает checkout_observers, сколько ждали
+    соединение. У пула нет события "до выдачи соединения", поэтому
+    замер в _do_get; dispose() пересоздает пул того же класса.
+    """
+
+    checkout_observers: List[Callable[[float], None]] = []
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            for observer in self.checkout_observers:
+                observer(elapsed)
+
+
+def timed_pool_class(database_url, is_async: bool = False) -> type:
+    """Пул, который диалект выбрал бы для URL, с замером ожидания checkout"""
+    url = make_url(database_url)
+    base = url.get_dialect(_is_async=is_async).get_pool_class(url)
+    # Свой класс и свой список слушателей на каждый движок
+    return type(
+        f"Timed{base.__name__}",
+        (TimedCheckoutPool, base),
+        {"checkout_observers": []},
+    )
+
+
+def apply_sqlite_profile(target_engine) -> None:
+    """Навешивает PRAGMA-профиль SQLITE_PRAGMAS на соединения движка"""
+    if target_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(target_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+def read_sqlite_settings(connection) -> dict:
+    """Читает фактические значения PRAGMA из активного соединения"""
+    return {
+        pragma: connection.execute(text(f"PRAGMA {pragma}")).scalar()
+        for pragma in SQLITE_PRAGMAS
+    }
+
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_ROWS = re.compile(r"(\(\?\))(?:\s*,\s*\(\?\))+")
+_fingerprints: Dict[str, str] = {}
+
+
+def statement_fingerprint(statement: str) -> str:
+    """Нормализует SQL: литералы, списки IN и строки VALUES заменяются на ?"""
+    fingerprint = _fingerprints.get(statement)
+    if fingerprint is None:
+        fingerprint = _WHITESPACE.sub(" ", statement).strip()
+        fingerprint = _LITERALS.sub("?", fingerprint)
+        fingerprint = _IN_LIST.sub("(?)", fingerprint)
+        fingerprint = _VALUES_ROWS.sub(r"\1", fingerprint)
+        if len(_fingerprints) >= 1024:
+            _fingerprints.clear()
+        _fingerprints[statement] = fingerprint
+    return fingerprint
+
+
+# ASGI scope текущего запроса: по нему журнал определяет эндпоинт
+current_request_scope: ContextVar[Optional[dict]] = ContextVar(
+    "current_request_scope", default=None
+)
+
+
+class RequestScopeMiddleware:
+    """Делает scope запроса доступным обработчикам событий SQLAlchemy"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        token = current_request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_scope.reset(token)
+
+
+def current_endpoint() -> Optional[str]:
+    scope = current_request_scope.get()
+    if scope is None or scope["type"] != "http":
+        return None
+    # route появляется в scope после маршрутизации
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route else scope['path']}"
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Типы параметров без значений: пользовательские данные в журнал не попадают"""
+    if executemany:
+        rows = list(parameters)
+        return {"rows": len(rows), "row": parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """Кольцевой буфер медленных запросов и план для каждого отпечатка"""
+
+    def __init__(self, size: int, max_plans: int = 500):
+        self.max_plans = max_plans
+        self._entries = deque(maxlen=size)
+        self._plans: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, entry: dict) -> None:
+        with self._lock:
+            self._entries.append(entry)
+
+    def needs_plan(self, fingerprint: str) -> bool:
+        return fingerprint not in self._plans and len(self._plans) < self.max_plans
 
+    def set_plan(self, fingerprint: str, plan: List[str]) -> None:
+        with self._lock:
+            self._plans[fingerprint] = plan
 
-def get_db():
-    db = SessionLocal()
+    def entries(self) -> List[dict]:
+        """Записи от новых к старым, с планом запроса"""
+        with self._lock:
+            entries = list(self._entries)
+        return [
+            {**entry, "plan": self._plans.get(entry["statement"])}
+            for entry in reversed(entries)
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_LOG_SIZE)
+
+EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+logger = logging.getLogger(__name__)
+
+
+def explain(connection, statement: str, parameters) -> List[str]:
+    """План запроса на том же соединении и с теми же параметрами"""
+    dialect = connection.dialect.name
+    cursor = connection.connection.cursor()
     try:
-        yield db
+        cursor.execute(EXPLAIN_PREFIXES[dialect] + statement, parameters)
+        rows = cursor.fetchall()
     finally:
-        db.close()
+        cursor.close()
+    # У SQLite текст шага в последней колонке (id, parent, notused, detail)
+    return [str(row[-1] if dialect == "sqlite" else row[0]) for row in rows]
+
+
+def enable_slow_query_log(target_engine, threshold_ms: float) -> None:
+    """Записывает в slow_query_log запросы дольше threshold_ms"""
+    threshold = threshold_ms / 1000
+    can_explain = target_engine.dialect.name in EXPLAIN_PREFIXES
+
+    @event.listens_for(target_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(target_engine, "after_cursor_execute")
+    def check_duration(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["slow_query_started"].pop()
+        if duration < threshold:
+            return
+
+        fingerprint = statement_fingerprint(statement)
+        endpoint = current_endpoint()
+        slow_query_log.add(
+            {
+                "timestamp": time.time(),
+                "duration_ms": round(duration * 1000, 3),
+                "statement": fingerprint,
+                "parameters": parameter_shape(parameters, executemany),
+                "endpoint": endpoint,
+            }
+        )
+        log_event(
+            logger,
+            logging.WARNING,
+            "slow_query",
+            sample=True,
+            statement=fingerprint,
+            duration_ms=round(duration * 1000, 3),
+            endpoint=endpoint,
+        )
+
+        if (
+            can_explain
+            and fingerprint.upper().startswith(EXPLAINABLE)
+            and slow_query_log.needs_plan(fingerprint)
+        ):
+            params = parameters[0] if executemany else parameters
+            try:
+                plan = explain(conn, statement, params)
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
+            slow_query_log.set_plan(fingerprint, plan)
+
+    @event.listens_for(target_engine, "handle_error")
+    def drop_timer(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("slow_query_started"):
+            connection.info["slow_query_started"].pop()
+
+
+# Синхронный путь: DB_SESSION_MODE=sync и CLI-утилиты (пересчет агрегатов,
+# бенчмарки)
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=timed_pool_class(DATABASE_URL),
+    **pool_options(DATABASE_URL),
+)
+apply_sqlite_profile(engine)
+
+SessionLocal = sessionmaker(
+    bind=engine, autoflush=False, autocommit=False, expire_on_commit=False
+)
+
+# Асинхронный путь: старт приложения и эндпоинты в режиме по умолчанию
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=timed_pool_class(ASYNC_DATABASE_URL, is_async=True),
+    **pool_options(ASYNC_DATABASE_URL),
+)
+apply_sqlite_profile(async_engine.sync_engine)
+
+if DB_SESSION_MODE == "sync" and is_memory_database(DATABASE_URL):
+    # Старт идет через async_engine, а в памяти у движков разные базы
+    raise ValueError("DB_SESSION_MODE=sync needs a file or server database")
+
+if SLOW_QUERY_THRESHOLD_MS:
+    enable_slow_query_log(engine, float(SLOW_QUERY_THRESHOLD_MS))
+    enable_slow_query_log(async_engine.sync_engine, float(SLOW_QUERY_THRESHOLD_MS))
+
+# expire_on_commit=False: после commit атрибуты не перечитываются лениво,
+# что в AsyncSession привело бы к неявному I/O вне await
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+Base = declarative_base()
+
+
+class ThreadedSession:
+    """
+    Синхронная Session с интерфейсом AsyncSession для DB_SESSION_MODE=sync.
+
+    Каждое обращение к БД выполняется в пуле потоков AnyIO через
+    синхронный драйвер и пул engine, как в sync def эндпоинтах. Обработчики
+    общие для обоих режимов, поэтому под k6 сравнивается только путь к БД.
+    """
+
+    def __init__(self, session: Session, stream_bind: AsyncEngine):
+        self.sync_session = session
+        # Потоковой выгрузке нужен async-движок той же базы
+        self.bind = stream_bind
+
+    @property
+    def info(self) -> dict:
+        return self.sync_session.info
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    async def execute(self, statement, *args, **kwargs):
+        def execute():
+            result = self.sync_session.execute(statement, *args, **kwargs)
+            # Строки читаются в том же потоке, как буферизует AsyncSession;
+            # у ORM-результатов returns_rows нет, у DML без RETURNING он False
+            if getattr(result, "returns_rows", True):
+                return result.freeze()()
+            return result
+
+        return await run_in_threadpool(execute)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalar, statement, *args, **kwargs
+        )
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance) -> None:
+        # Каскад delete-orphan подгружает связанные строки
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def refresh(self, instance, **kwargs) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, **kwargs)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
+@asynccontextmanager
+async def open_session(
+    async_factory=AsyncSessionLocal,
+    sync_factory=SessionLocal,
+    stream_bind=None,
+    mode: Optional[str] = None,
+):
+    """Сессия запроса по DB_SESSION_MODE: AsyncSession или ThreadedSession"""
+    if (mode or DB_SESSION_MODE) == "sync":
+        db = ThreadedSession(sync_factory(), stream_bind or async_engine)
+        try:
+            yield db
+        finally:
+            await db.close()
+    else:
+        async with async_factory() as db:
+            yield db
+
+
+async def get_async_db():
+    # Контекстный менеджер, а не async for: исключение обработчика
+    # пробрасывается в open_session, и сессия закрывается сразу, а не при
+    # сборке мусора (в режиме sync незакрытая сессия держит блокировку записи)
+    async with open_session() as db:
+        yield db
@@ -1,3 +1,4 @@
+import logging
 from datetime import datetime
 from typing import Any, Dict
 from uuid import uuid4
@@ -5,6 +6,8 @@ from uuid import uuid4
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse
 
+logger = logging.getLogger(__name__)
+
 
 class ApiError(Exception):
     """Кастомное исключение приложения с кодом ошибки"""
@@ -23,6 +26,7 @@ def create_problem_response(
     error_code: str = None,
     instance: str = None,
     extras: Dict[str, Any] = None,
+    correlation_id: str = None,
 ) -> JSONResponse:
     """
     Создает RFC 7807 compliant ответ об ошибке
@@ -35,8 +39,9 @@ def create_problem_response(
         error_code: Внутренний код ошибки для обратной совместимости
         instance: URI конкретного экземпляра ошибки
         extras: Дополнительные поля
+        correlation_id: ID для связи ответа с записью в логе
     """
-    correlation_id = str(uuid4())
+    correlation_id = correlation_id or str(uuid4())
     timestamp = datetime.utcnow().isoformat() + "Z"
 
     payload = {
@@ -114,6 +119,18 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 async def general_exception_handler(request: Request, exc: Exception):
     """Обработчик непредвиденных исключений"""
+    correlation_id = str(uuid4())
+    logger.error(
+        "unhandled_exception",
+        exc_info=exc,
+        extra={
+            "fields": {
+                "correlation_id": correlation_id,
+                "method": request.method,
+                "path": request.url.path,
+            }
+        },
+    )
     return create_problem_response(
         status=500,
         title="Internal Server Error",
@@ -121,4 +138,5 @@ async def general_exception_handler(request: Request, exc: Exception):
         error_type="https://habittracker.com/errors/internal-error",
         error_code="INTERNAL_ERROR",
         instance=request.url.path,
+        correlation_id=correlation_id,
     )
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = ("id", "habit_id", "checkin_date", "completed")
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps(
+            {
+                "id": row.id,
+                "habit_id": row.habit_id,
+                "checkin_date": row.checkin_date.isoformat(),
+                "completed": bool(row.completed),
+            },
+            ensure_ascii=False,
+        )
+        + "\n"
+        for row in rows
+    )
+
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(
+        (row.id, row.habit_id, row.checkin_date.isoformat(), bool(row.completed))
+        for row in rows
+    )
+    return buffer.getvalue()
+
+
+async def stream_rows(
+    engine: AsyncEngine, query: Select, export_format: str
+) -> AsyncIterator[str]:
+    """
+    Выгружает результат запроса порциями через серверный курсор.
+    В памяти одновременно находится не больше EXPORT_BATCH_SIZE строк.
+
+    Args:
+        engine: Движок, из которого берется отдельное соединение на время выгрузки
+        query: Core-запрос с колонками EXPORT_COLUMNS
+        export_format: "ndjson" или "csv"
+    """
+    if export_format == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\n"
+        serialize = _csv_chunk
+    else:
+        serialize = _ndjson_chunk
+
+    async with engine.connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield serialize(rows)
@@ -1,77 +1,256 @@
+import hmac
+import logging
 from contextlib import asynccontextmanager
-from datetime import timedelta
-from typing import List
-
-from fastapi import Depends, FastAPI, HTTPException, Request
-from markupsafe import escape
-from sqlalchemy import Integer, func, text
-from sqlalchemy.orm import Session
-
+from datetime import date, timedelta
+from typing import List, Literal, Optional, Union
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import (
+    Boolean,
+    Date,
+    Integer,
+    and_,
+    cast,
+    func,
+    insert,
+    literal,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .aggregates import (
+    ensure_aggregates,
+    record_checkins,
+    record_habit_created,
+    record_habit_deleted,
+    record_user_write,
+)
 from .auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     authenticate_user,
     create_access_token,
     get_current_user,
-    get_password_hash,
+    require_admin_key,
+)
+from .auth_cache import Principal, principal_cache
+from .database import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    SLOW_QUERY_THRESHOLD_MS,
+    AsyncSessionLocal,
+    RequestScopeMiddleware,
+    async_engine,
+    engine,
+    get_async_db,
+    read_sqlite_settings,
+    slow_query_log,
 )
-from .database import engine, get_db
 from .errorsRFC7807 import (
     ApiError,
     api_error_handler,
     general_exception_handler,
     http_exception_handler,
 )
-from .models import Base, Checkin, Habit, User
+from .export import EXPORT_MEDIA_TYPES, stream_rows
+from .metrics import (
+    CONTENT_TYPE,
+    METRICS_ENABLED,
+    METRICS_TOKEN,
+    MetricsMiddleware,
+    instrument_engine,
+    registry,
+)
+from .models import (
+    Base,
+    Checkin,
+    Habit,
+    HabitStats,
+    User,
+    UserStats,
+    backfill_habit_names,
+    create_missing_columns,
+    create_missing_indexes,
+)
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, build_page, decode_cursor
+from .password_hashing import PasswordHasherBusy, password_hasher
 from .rate_limit import init_rate_limiting, limiter
+from .readiness import (
+    LIVE_BODY,
+    READINESS_PROBE_INTERVAL_SECONDS,
+    READINESS_PROBE_TIMEOUT_SECONDS,
+    ReadinessProbe,
+)
 from .schemas import (
+    CheckinBatchCreate,
+    CheckinBatchResponse,
     CheckinCreate,
+    CheckinPage,
     CheckinResponse,
     HabitCreate,
+    HabitPage,
     HabitResponse,
+    HabitStatsResponse,
+    HabitStatsSummary,
     HabitWithCheckins,
     StatsResponse,
     Token,
     UserLogin,
 )
+from .serialization import (
+    CHECKIN_COLUMNS,
+    HABIT_COLUMNS,
+    DefaultResponse,
+    habit_response,
+    rows_as_dicts,
+    trusted_response,
+)
+from .stats_engine import completion_rate, compute_adherence
+from .structured_log import log_event, structured_logging
+from .versioning import NotModified, conditional_get, not_modified_handler
+
+logger = logging.getLogger(__name__)
+readiness = ReadinessProbe(
+    async_engine, READINESS_PROBE_INTERVAL_SECONDS, READINESS_PROBE_TIMEOUT_SECONDS
+)
 
 
-def init_test_user(db: Session):
+async def init_test_user():
     """Инициализация тестового пользователя с паролем"""
-    try:
-        test_user = db.query(User).filter(User.username == "test_user").first()
-        if not test_user:
-            test_user = User(
-                username="test_user", password=get_password_hash("test_password")
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await db.execute(
+                select(User.id).where(User.username == "test_user")
             )
-            db.add(test_user)
-            db.commit()
-            print("Test user created (test_user: test_password)")
-        else:
-            print("Test user already exists (test_user: test_password)")
-    except Exception as e:
-        print(f"Error during startup: {e}")
-        db.rollback()
+            if result.first() is None:
+                # bcrypt в пуле процессов, чтобы не блокировать event loop
+                password = await password_hasher.hash("test_password")
+                db.add(User(username="test_user", password=password))
+                await db.commit()
+                log_event(
+                    logger, logging.INFO, "test_user_created", username="test_user"
+                )
+            else:
+                log_event(
+                    logger, logging.INFO, "test_user_exists", username="test_user"
+                )
+        except Exception:
+            logger.exception("test_user_init_failed")
+            await db.rollback()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan manager для инициализации при запуске и очистки при завершении"""
-    print("Starting up...")
-
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created")
-
-    db = next(get_db())
-    init_test_user(db)
+    structured_logging.start()
+    log_event(logger, logging.INFO, "startup")
+
+    # Весь старт идет через async_engine, как и запросы: для sqlite:///:memory:
+    # у каждого движка была бы своя база
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    log_event(logger, logging.INFO, "database_tables_created")
+
+    # Старт прерывается, если дубли отметок мешают уникальному индексу:
+    # без него повторные отметки на ту же дату снова станут возможны
+    async with async_engine.connect() as conn:
+        await conn.run_sync(create_missing_indexes)
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(create_missing_columns)
+        backfilled = await conn.run_sync(backfill_habit_names)
+    if backfilled:
+        log_event(logger, logging.INFO, "habit_names_backfilled", habits=backfilled)
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(ensure_aggregates)
+
+    await init_test_user()
+    readiness.start()
     yield
 
-    print("Shutting down...")
+    log_event(logger, logging.INFO, "shutdown")
+    await readiness.stop()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+    structured_logging.stop()
 
 
-app = FastAPI(title="Habit Tracker App", version="0.1.0", lifespan=lifespan)
+app = FastAPI(
+    title="Habit Tracker App",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=DefaultResponse,
+)
 app = init_rate_limiting(app)
 
 
+def component_metrics():
+    """Счетчики компонентов, которые ведут статистику сами"""
+    hasher = password_hasher
+    yield (
+        "password_hash_seconds_total",
+        "counter",
+        "Time spent in bcrypt",
+        hasher.hash_seconds,
+    )
+    yield (
+        "password_hash_queue_wait_seconds_total",
+        "counter",
+        "Time bcrypt jobs waited for a worker",
+        hasher.queue_wait_seconds,
+    )
+    yield ("password_hash_total", "counter", "bcrypt jobs", hasher.completed)
+    yield (
+        "password_hash_rejected_total",
+        "counter",
+        "bcrypt jobs rejected by a full queue",
+        hasher.rejected,
+    )
+    yield (
+        "password_hash_pool_restarts_total",
+        "counter",
+        "bcrypt pools recreated after a worker died",
+        hasher.pool_restarts,
+    )
+    yield (
+        "rate_limit_rejected_total",
+        "counter",
+        "Requests rejected by the rate limiter",
+        limiter.rejected,
+    )
+    yield (
+        "auth_cache_hits_total",
+        "counter",
+        "Principal cache hits",
+        principal_cache.hits,
+    )
+    yield (
+        "auth_cache_misses_total",
+        "counter",
+        "Principal cache misses",
+        principal_cache.misses,
+    )
+    yield (
+        "log_records_dropped_total",
+        "counter",
+        "Log records dropped by a full queue",
+        structured_logging.stats()["dropped"],
+    )
+
+
+app.add_middleware(RequestScopeMiddleware)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+    registry.add_collector(component_metrics)
+
+
 # Security Headers Middleware
 @app.middleware("http")
 async def add_security_headers(request: Request, call_next):
@@ -91,39 +270,109 @@ async def add_security_headers(request: Request, call_next):
 
 # Регистрируем обработчики ошибок
 app.add_exception_handler(ApiError, api_error_handler)
+app.add_exception_handler(NotModified, not_modified_handler)
 app.add_exception_handler(HTTPException, http_exception_handler)
 app.add_exception_handler(Exception, general_exception_handler)
 
 
+@app.get("/health/live")
+async def health_live():
+    """Процесс жив и обслуживает event loop. БД не проверяется"""
+    return Response(content=LIVE_BODY, media_type="application/json")
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """Последний результат фоновой проверки готовности"""
+    return readiness.response()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Метрики в формате Prometheus (без rate limit)"""
+    # Без токена метрики закрыты, как и /admin/* без ADMIN_API_KEY:
+    # в них маршруты и отпечатки SQL
+    if not METRICS_ENABLED or not METRICS_TOKEN:
+        raise ApiError(code="NOT_FOUND", message="Metrics disabled", status=404)
+    if not hmac.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        raise ApiError(code="UNAUTHORIZED", message="Invalid metrics token", status=401)
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/admin/slow-queries", dependencies=[Depends(require_admin_key)])
+async def slow_queries():
+    """Медленные запросы с нормализованным SQL, эндпоинтом и планом"""
+    return {
+        "enabled": bool(SLOW_QUERY_THRESHOLD_MS),
+        "threshold_ms": (
+            float(SLOW_QUERY_THRESHOLD_MS) if SLOW_QUERY_THRESHOLD_MS else None
+        ),
+        "entries": slow_query_log.entries(),
+    }
+
+
 @app.get("/health")
 @limiter.limit("50/minute")
-def health(request: Request, db: Session = Depends(get_db)):
+async def health(request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
-        result = db.execute(text("SELECT 1")).fetchone()
-        print(f"DB test result: {result}")
+        result = (await db.execute(text("SELECT 1"))).fetchone()
+        log_event(logger, logging.DEBUG, "health_db_probe", result=result[0])
+
+        if logger.isEnabledFor(logging.DEBUG):
+            tables = (
+                await db.execute(
+                    text("SELECT name FROM sqlite_master WHERE type='table'")
+                )
+            ).fetchall()
+            log_event(
+                logger, logging.DEBUG, "health_tables", tables=[t[0] for t in tables]
+            )
 
-        tables = db.execute(
-            text("SELECT name FROM sqlite_master WHERE type='table'")
-        ).fetchall()
-        print(f"Available tables: {[t[0] for t in tables]}")
+        sqlite_settings = None
+        if async_engine.dialect.name == "sqlite":
+            sqlite_settings = await db.run_sync(read_sqlite_settings)
 
-        db.commit()
+        await db.commit()
         db_status = "connected"
     except Exception as e:
-        print(f"DB health check error: {e}")
-        db.rollback()
+        log_event(logger, logging.ERROR, "health_db_error", error=str(e))
+        await db.rollback()
         db_status = f"disconnected: {str(e)}"
+        sqlite_settings = None
 
-    return {"status": "ok", "database": db_status}
+    return {
+        "status": "ok",
+        "database": db_status,
+        "sqlite": sqlite_settings,
+        "pool": {
+            "size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "status": async_engine.pool.status(),
+        },
+        "auth_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limit": limiter.stats(),
+    }
 
 
 # Эндпоинты аутентификации
 @app.post("/login", response_model=Token)
-def login_for_access_token(form_data: UserLogin, db: Session = Depends(get_db)):
+async def login_for_access_token(
+    form_data: UserLogin, db: AsyncSession = Depends(get_async_db)
+):
     """
     Безопасный вход в систему
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        raise ApiError(
+            code="SERVICE_UNAVAILABLE",
+            message="Сервис перегружен, повторите попытку позже",
+            status=503,
+        )
 
     if not user:
         raise ApiError(
@@ -141,7 +390,7 @@ def login_for_access_token(form_data: UserLogin, db: Session = Depends(get_db)):
 
 
 @app.get("/users/me")
-def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     """Получить информацию о текущем пользователе"""
     return {
         "id": current_user.id,
@@ -151,10 +400,10 @@ def read_users_me(current_user: User = Depends(get_current_user)):
 
 # Habit Endpoints
 @app.post("/habits", response_model=HabitResponse)
-def create_habit(
+async def create_habit(
     habit: HabitCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Создать новую привычку"""
     db_habit = Habit(
@@ -162,181 +411,440 @@ def create_habit(
     )
 
     db.add(db_habit)
-    db.commit()
-    db.refresh(db_habit)
+    await record_habit_created(db, current_user.id)
+    await db.commit()
+    await db.refresh(db_habit)
 
-    return db_habit
+    return habit_response(db_habit)
 
 
-@app.get("/habits", response_model=List[HabitResponse])
-def get_habits(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+@app.get(
+    "/habits",
+    response_model=Union[HabitPage, List[HabitResponse]],
+    dependencies=[Depends(conditional_get)],
+)
+async def get_habits(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Получить все привычки ТЕКУЩЕГО пользователя"""
-    habits = db.query(Habit).filter(Habit.user_id == current_user.id).all()
+    """
+    Получить привычки ТЕКУЩЕГО пользователя в порядке id
 
-    for habit in habits:
-        habit.name = escape(habit.name)
+    Без limit и after отдается весь список, как раньше; с любым из них -
+    страница {"items", "next_cursor"}
+    """
+    query = select(*HABIT_COLUMNS).where(Habit.user_id == current_user.id)
+    if after:
+        (after_id,) = decode_cursor(after, (int,))
+        query = query.where(Habit.id > after_id)
+
+    # Индекс ix_habits_user_id (user_id, rowid) отдает строки уже в порядке id
+    query = query.order_by(Habit.id)
+    if limit is None and after is None:
+        result = await db.execute(query)
+        return trusted_response(rows_as_dicts(result), response)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    result = await db.execute(query.limit(limit + 1))
+    habits = rows_as_dicts(result)
+    page = build_page(habits, limit, lambda habit: (habit["id"],))
+    return trusted_response(page, response)
+
+
+@app.get(
+    "/habits/stats",
+    response_model=List[HabitStatsSummary],
+    dependencies=[Depends(conditional_get)],
+)
+async def get_all_habit_stats(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Получить статистику по всем привычкам пользователя одним запросом"""
+    if date_from is None and date_to is None:
+        # Без окна хватает поддерживаемых агрегатов habit_stats
+        total = func.coalesce(HabitStats.total_checkins, 0)
+        completed = func.coalesce(HabitStats.completed_checkins, 0)
+        query = select(Habit.id, Habit.name_html, Habit.periodicity, total, completed)
+        query = query.outerjoin(HabitStats, HabitStats.habit_id == Habit.id)
+    else:
+        # Условия окна в ON, чтобы привычки без отметок остались в выдаче
+        join_on = [Checkin.habit_id == Habit.id]
+        if date_from is not None:
+            join_on.append(Checkin.checkin_date >= date_from)
+        if date_to is not None:
+            join_on.append(Checkin.checkin_date <= date_to)
+
+        total = func.count(Checkin.id)
+        completed = func.coalesce(func.sum(cast(Checkin.completed, Integer)), 0)
+        query = select(Habit.id, Habit.name_html, Habit.periodicity, total, completed)
+        query = query.outerjoin(Checkin, and_(*join_on)).group_by(Habit.id)
+
+    result = await db.execute(
+        query.where(Habit.user_id == current_user.id).order_by(Habit.id)
+    )
 
-    return habits
+    return [
+        HabitStatsSummary(
+            habit_id=habit_id,
+            habit_name=name,
+            periodicity=periodicity,
+            total_checkins=total_checkins,
+            completed_checkins=completed_checkins,
+            completion_rate=completion_rate(total_checkins, completed_checkins),
+        )
+        for habit_id, name, periodicity, total_checkins, completed_checkins in result
+    ]
 
 
-@app.get("/habits/{habit_id}", response_model=HabitResponse)
-def get_habit(
+@app.get(
+    "/habits/{habit_id}",
+    response_model=HabitResponse,
+    dependencies=[Depends(conditional_get)],
+)
+async def get_habit(
     habit_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    habit = (
-        db.query(Habit)
-        .filter(Habit.id == habit_id, Habit.user_id == current_user.id)
-        .first()
+    result = await db.execute(
+        select(*HABIT_COLUMNS).where(
+            Habit.id == habit_id, Habit.user_id == current_user.id
+        )
     )
+    habit = result.mappings().first()
     if not habit:
         raise ApiError(code="NOT_FOUND", message="Habit not found", status=404)
-    habit.name = escape(habit.name)
     return habit
 
 
-@app.get("/habits/{habit_id}/detailed", response_model=HabitWithCheckins)
-def get_habit_detailed(
+@app.get(
+    "/habits/{habit_id}/detailed",
+    response_model=HabitWithCheckins,
+    dependencies=[Depends(conditional_get)],
+)
+async def get_habit_detailed(
     habit_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Получить привычку по ID с всеми отметками"""
-    habit = (
-        db.query(Habit)
-        .filter(Habit.id == habit_id, Habit.user_id == current_user.id)
-        .first()
+    """
+    Получить привычку по ID с отметками
+
+    Без from, to и limit отдаются все отметки по возрастанию даты, как раньше;
+    с любым из них - последние limit отметок за период, новые первыми
+    """
+    result = await db.execute(
+        select(*HABIT_COLUMNS).where(
+            Habit.id == habit_id, Habit.user_id == current_user.id
+        )
     )
+    habits = rows_as_dicts(result)
 
-    if not habit:
+    if not habits:
         raise ApiError(code="NOT_FOUND", message="Habit not found", status=404)
-
-    habit.name = escape(habit.name)
-    return habit
+    habit = habits[0]
+
+    # Окно отметок читается по индексу (habit_id, checkin_date),
+    # а не через ленивую загрузку всей истории привычки
+    query = select(*CHECKIN_COLUMNS).where(Checkin.habit_id == habit_id)
+    if date_from is not None:
+        query = query.where(Checkin.checkin_date >= date_from)
+    if date_to is not None:
+        query = query.where(Checkin.checkin_date <= date_to)
+    if date_from is None and date_to is None and limit is None:
+        query = query.order_by(Checkin.checkin_date)
+    else:
+        query = query.order_by(Checkin.checkin_date.desc())
+        query = query.limit(limit or DEFAULT_PAGE_SIZE)
+
+    result = await db.execute(query)
+    habit["checkins"] = rows_as_dicts(result)
+    return trusted_response(habit, response)
 
 
 @app.put("/habits/{habit_id}", response_model=HabitResponse)
-def update_habit(
+async def update_habit(
     habit_id: int,
     habit: HabitCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить привычку"""
-    db_habit = (
-        db.query(Habit)
-        .filter(Habit.id == habit_id, Habit.user_id == current_user.id)
-        .first()
+    result = await db.execute(
+        select(Habit).where(Habit.id == habit_id, Habit.user_id == current_user.id)
     )
+    db_habit = result.scalars().first()
 
     if not db_habit:
         raise ApiError(code="NOT_FOUND", message="Habit not found", status=404)
 
     db_habit.name = habit.name
     db_habit.periodicity = habit.periodicity
+    await record_user_write(db, current_user.id)
 
-    db.commit()
-    db.refresh(db_habit)
+    await db.commit()
+    await db.refresh(db_habit)
 
-    db_habit.name = escape(db_habit.name)
-    return db_habit
+    return habit_response(db_habit)
 
 
 @app.delete("/habits/{habit_id}")
-def delete_habit(
+async def delete_habit(
     habit_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Удалить привычку"""
-    db_habit = (
-        db.query(Habit)
-        .filter(Habit.id == habit_id, Habit.user_id == current_user.id)
-        .first()
+    result = await db.execute(
+        select(Habit).where(Habit.id == habit_id, Habit.user_id == current_user.id)
     )
+    db_habit = result.scalars().first()
 
     if not db_habit:
         raise ApiError(code="NOT_FOUND", message="Habit not found", status=404)
 
-    db.delete(db_habit)
-    db.commit()
+    await record_habit_deleted(db, current_user.id, db_habit.id)
+    await db.delete(db_habit)
+    await db.commit()
 
     return {"message": "Habit deleted"}
 
 
 # Checkin Endpoints
 @app.post("/checkins", response_model=CheckinResponse)
-def create_checkin(
+async def create_checkin(
     checkin: CheckinCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Создать отметку о выполнении привычки"""
-    habit = (
-        db.query(Habit)
-        .filter(Habit.id == checkin.habit_id, Habit.user_id == current_user.id)
-        .first()
-    )
-
-    if not habit:
-        raise ApiError(code="NOT_FOUND", message="Habit not found", status=404)
-
-    existing_checkin = (
-        db.query(Checkin)
-        .filter(
-            Checkin.habit_id == checkin.habit_id,
-            Checkin.checkin_date == checkin.checkin_date,
+    # Проверка владельца и вставка одним INSERT ... SELECT: для чужой или
+    # несуществующей привычки SELECT пуст и строка не вставляется.
+    # Дубликат ловим по уникальному индексу (habit_id, checkin_date):
+    # без предварительного SELECT и без гонки между параллельными запросами
+    stmt = (
+        insert(Checkin)
+        .from_select(
+            ["habit_id", "checkin_date", "completed"],
+            select(
+                Habit.id,
+                literal(checkin.checkin_date, Date),
+                literal(checkin.completed, Boolean),
+            ).where(Habit.id == checkin.habit_id, Habit.user_id == current_user.id),
+        )
+        .returning(
+            Checkin.id, Checkin.habit_id, Checkin.checkin_date, Checkin.completed
         )
-        .first()
     )
-
-    if existing_checkin:
+    try:
+        created = (await db.execute(stmt)).first()
+        if created is None:
+            raise ApiError(code="NOT_FOUND", message="Habit not found", status=404)
+        await record_checkins(
+            db, current_user.id, {checkin.habit_id: (1, int(checkin.completed))}
+        )
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
         raise ApiError(
             code="DUPLICATE_CHECKIN",
             message="Checkin already exists for this date",
             status=400,
         )
 
-    db_checkin = Checkin(
-        habit_id=checkin.habit_id,
-        checkin_date=checkin.checkin_date,
-        completed=checkin.completed,
+    return created._asdict()
+
+
+@app.post("/checkins/batch", response_model=CheckinBatchResponse)
+async def create_checkins_batch(
+    batch: CheckinBatchCreate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Создать пакет отметок одной транзакцией с результатом по каждой"""
+    habit_ids = {item.habit_id for item in batch.items}
+    result = await db.execute(
+        select(Habit.id).where(
+            Habit.id.in_(habit_ids), Habit.user_id == current_user.id
+        )
     )
+    owned_ids = set(result.scalars().all())
+
+    # Уже существующие пары (habit_id, checkin_date) одним запросом
+    existing = set()
+    if owned_ids:
+        result = await db.execute(
+            select(Checkin.habit_id, Checkin.checkin_date).where(
+                Checkin.habit_id.in_(owned_ids),
+                Checkin.checkin_date.in_({item.checkin_date for item in batch.items}),
+            )
+        )
+        existing = {(row.habit_id, row.checkin_date) for row in result}
+
+    results = []
+    rows = []
+    for index, item in enumerate(batch.items):
+        key = (item.habit_id, item.checkin_date)
+        if item.habit_id not in owned_ids:
+            results.append({"index": index, "status": "not_found"})
+        elif key in existing:
+            results.append({"index": index, "status": "duplicate"})
+        else:
+            # Повтор внутри пакета тоже считается дубликатом
+            existing.add(key)
+            results.append({"index": index, "status": "created"})
+            rows.append(item.model_dump())
+
+    if rows:
+        deltas = {}
+        for row in rows:
+            total, completed = deltas.get(row["habit_id"], (0, 0))
+            deltas[row["habit_id"]] = (total + 1, completed + int(row["completed"]))
+        await record_checkins(db, current_user.id, deltas)
+
+        try:
+            # insertmanyvalues: многострочный INSERT ... RETURNING вместо N запросов.
+            # sort_by_parameter_order на SQLite без столбца-сентинела вырождается
+            # в INSERT на каждую строку, поэтому id сопоставляются по ключу
+            result = await db.execute(
+                insert(Checkin).returning(
+                    Checkin.id, Checkin.habit_id, Checkin.checkin_date
+                ),
+                rows,
+            )
+            created_ids = {(row.habit_id, row.checkin_date): row.id for row in result}
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise ApiError(
+                code="BATCH_CONFLICT",
+                message="Checkins were modified concurrently, retry the batch",
+                status=409,
+            )
 
-    db.add(db_checkin)
-    db.commit()
-    db.refresh(db_checkin)
+        for item, item_result in zip(batch.items, results):
+            if item_result["status"] == "created":
+                item_result["id"] = created_ids[(item.habit_id, item.checkin_date)]
 
-    return db_checkin
+    return {
+        "created": len(rows),
+        "duplicate": sum(r["status"] == "duplicate" for r in results),
+        "not_found": sum(r["status"] == "not_found" for r in results),
+        "results": results,
+    }
 
 
-@app.get("/checkins", response_model=List[CheckinResponse])
-def get_checkins(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+@app.get(
+    "/checkins",
+    response_model=Union[CheckinPage, List[CheckinResponse]],
+    dependencies=[Depends(conditional_get)],
+)
+async def get_checkins(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    habit_id: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Получить все отметки"""
-    checkins = (
-        db.query(Checkin).join(Habit).filter(Habit.user_id == current_user.id).all()
+    """
+    Получить отметки в порядке (habit_id, checkin_date)
+
+    Без limit и after отдается весь список, как раньше; с любым из них -
+    страница {"items", "next_cursor"}
+    """
+    query = select(*CHECKIN_COLUMNS).join(Habit).where(Habit.user_id == current_user.id)
+    if habit_id is not None:
+        query = query.where(Checkin.habit_id == habit_id)
+    if after:
+        after_habit, after_date = decode_cursor(after, (int, date.fromisoformat))
+        # Ключ Habit.id, а не Checkin.habit_id: так SQLite сужает обход
+        # ix_habits_user_id до id >= after_habit
+        query = query.where(
+            tuple_(Habit.id, Checkin.checkin_date) > (after_habit, after_date)
+        )
+
+    # Привычки обходятся по ix_habits_user_id в порядке id, отметки каждой -
+    # по uq_checkins_habit_date (habit_id, checkin_date): порядок дают индексы,
+    # без сортировки во временном B-дереве. Пара уникальна, id не нужен
+    query = query.order_by(Habit.id, Checkin.checkin_date)
+    if limit is None and after is None:
+        result = await db.execute(query)
+        return trusted_response(rows_as_dicts(result), response)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    result = await db.execute(query.limit(limit + 1))
+    checkins = rows_as_dicts(result)
+
+    page = build_page(
+        checkins,
+        limit,
+        lambda checkin: (checkin["habit_id"], checkin["checkin_date"]),
     )
-    return checkins
+    return trusted_response(page, response)
+
 
+@app.get("/checkins/export")
+async def export_checkins(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    habit_id: Optional[int] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Выгрузить все отметки пользователя потоком NDJSON или CSV"""
+    query = (
+        select(Checkin.id, Checkin.habit_id, Checkin.checkin_date, Checkin.completed)
+        .join(Habit)
+        .where(Habit.user_id == current_user.id)
+    )
+    if habit_id is not None:
+        query = query.where(Checkin.habit_id == habit_id)
+    if date_from is not None:
+        query = query.where(Checkin.checkin_date >= date_from)
+    if date_to is not None:
+        query = query.where(Checkin.checkin_date <= date_to)
+    query = query.order_by(Checkin.checkin_date, Checkin.id)
+
+    # Сессия зависимости закрывается до отправки тела ответа,
+    # поэтому выгрузка берет собственное соединение из того же движка
+    return StreamingResponse(
+        stream_rows(db.bind, query, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f"attachment; filename=checkins.{export_format}"
+        },
+    )
 
-@app.get("/checkins/{checkin_id}", response_model=CheckinResponse)
-def get_checkin(
+
+@app.get(
+    "/checkins/{checkin_id}",
+    response_model=CheckinResponse,
+    dependencies=[Depends(conditional_get)],
+)
+async def get_checkin(
     checkin_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить отметку по ID"""
-    checkin = (
-        db.query(Checkin)
+    result = await db.execute(
+        select(Checkin)
         .join(Habit)
-        .filter(Checkin.id == checkin_id, Habit.user_id == current_user.id)
-        .first()
+        .where(Checkin.id == checkin_id, Habit.user_id == current_user.id)
     )
+    checkin = result.scalars().first()
 
     if not checkin:
         raise ApiError(code="NOT_FOUND", message="Checkin not found", status=404)
@@ -345,160 +853,143 @@ def get_checkin(
 
 
 @app.put("/checkins/{checkin_id}", response_model=CheckinResponse)
-def update_checkin(
+async def update_checkin(
     checkin_id: int,
     checkin: CheckinCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить отметку"""
-    db_checkin = (
-        db.query(Checkin)
+    result = await db.execute(
+        select(Checkin)
         .join(Habit)
-        .filter(Checkin.id == checkin_id, Habit.user_id == current_user.id)
-        .first()
+        .where(Checkin.id == checkin_id, Habit.user_id == current_user.id)
     )
+    db_checkin = result.scalars().first()
 
     if not db_checkin:
         raise ApiError(code="NOT_FOUND", message="Checkin not found", status=404)
 
     if db_checkin.habit_id != checkin.habit_id:
-        new_habit = (
-            db.query(Habit)
-            .filter(Habit.id == checkin.habit_id, Habit.user_id == current_user.id)
-            .first()
+        result = await db.execute(
+            select(Habit).where(
+                Habit.id == checkin.habit_id, Habit.user_id == current_user.id
+            )
         )
+        new_habit = result.scalars().first()
 
         if not new_habit:
             raise ApiError(code="NOT_FOUND", message="Habit not found", status=404)
 
-    if (
-        db_checkin.habit_id != checkin.habit_id
-        or db_checkin.checkin_date != checkin.checkin_date
-    ):
-        existing_checkin = (
-            db.query(Checkin)
-            .filter(
-                Checkin.habit_id == checkin.habit_id,
-                Checkin.checkin_date == checkin.checkin_date,
-                Checkin.id != checkin_id,
-            )
-            .first()
-        )
-
-        if existing_checkin:
-            raise ApiError(
-                code="DUPLICATE_CHECKIN",
-                message="Checkin already exists for this date",
-                status=400,
-            )
+    deltas = {db_checkin.habit_id: (-1, -int(db_checkin.completed))}
+    total, completed = deltas.get(checkin.habit_id, (0, 0))
+    deltas[checkin.habit_id] = (total + 1, completed + int(checkin.completed))
+    await record_checkins(db, current_user.id, deltas)
 
     db_checkin.habit_id = checkin.habit_id
     db_checkin.checkin_date = checkin.checkin_date
     db_checkin.completed = checkin.completed
 
-    db.commit()
-    db.refresh(db_checkin)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise ApiError(
+            code="DUPLICATE_CHECKIN",
+            message="Checkin already exists for this date",
+            status=400,
+        )
 
     return db_checkin
 
 
 @app.delete("/checkins/{checkin_id}")
-def delete_checkin(
+async def delete_checkin(
     checkin_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Удалить отметку"""
-    checkin = (
-        db.query(Checkin)
+    result = await db.execute(
+        select(Checkin)
         .join(Habit)
-        .filter(Checkin.id == checkin_id, Habit.user_id == current_user.id)
-        .first()
+        .where(Checkin.id == checkin_id, Habit.user_id == current_user.id)
     )
+    checkin = result.scalars().first()
 
     if not checkin:
         raise ApiError(code="NOT_FOUND", message="Checkin not found", status=404)
 
-    db.delete(checkin)
-    db.commit()
+    await record_checkins(
+        db, current_user.id, {checkin.habit_id: (-1, -int(checkin.completed))}
+    )
+    await db.delete(checkin)
+    await db.commit()
 
     return {"message": "Checkin deleted"}
 
 
 # Stats Endpoints
-@app.get("/stats", response_model=StatsResponse)
-def get_stats(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+@app.get(
+    "/stats",
+    response_model=StatsResponse,
+    dependencies=[Depends(conditional_get)],
+)
+async def get_stats(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить общую статистику по привычкам"""
-    # Статистика привычек
-    total_habits = db.query(Habit).filter(Habit.user_id == current_user.id).count()
-
-    # Статистика отметок
-    checkin_stats = (
-        db.query(
-            func.count(Checkin.id).label("total"),
-            func.sum(func.cast(Checkin.completed, Integer)).label("completed"),
-        )
-        .join(Habit)
-        .filter(Habit.user_id == current_user.id)
-        .first()
-    )
+    # Агрегаты поддерживаются эндпоинтами записи - чтение по первичному ключу
+    user_stats = await db.get(UserStats, current_user.id)
 
-    total_checkins = checkin_stats.total or 0
-    completed_checkins = checkin_stats.completed or 0
-
-    completion_rate = 0.0
-    if total_checkins > 0:
-        completion_rate = round((completed_checkins / total_checkins) * 100, 2)
+    total_habits = user_stats.total_habits if user_stats else 0
+    total_checkins = user_stats.total_checkins if user_stats else 0
+    completed_checkins = user_stats.completed_checkins if user_stats else 0
 
     return StatsResponse(
         total_habits=total_habits,
         total_checkins=total_checkins,
         completed_checkins=completed_checkins,
-        completion_rate=completion_rate,
+        completion_rate=completion_rate(total_checkins, completed_checkins),
     )
 
 
-@app.get("/habits/{habit_id}/stats")
-def get_habit_stats(
+@app.get("/habits/{habit_id}/stats", response_model=HabitStatsResponse)
+async def get_habit_stats(
     habit_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить статистику по конкретной привычке"""
-    habit = (
-        db.query(Habit)
-        .filter(Habit.id == habit_id, Habit.user_id == current_user.id)
-        .first()
+    result = await db.execute(
+        select(Habit.name_html, Habit.periodicity).where(
+            Habit.id == habit_id, Habit.user_id == current_user.id
+        )
     )
+    habit = result.first()
 
     if not habit:
         raise ApiError(code="NOT_FOUND", message="Habit not found", status=404)
 
-    checkin_stats = (
-        db.query(
-            func.count(Checkin.id).label("total"),
-            func.sum(func.cast(Checkin.completed, Integer)).label("completed"),
-        )
-        .join(Habit)
-        .filter(Habit.user_id == current_user.id)
-        .first()
-    )
-
-    total_checkins = checkin_stats.total or 0
-    completed_checkins = checkin_stats.completed or 0
+    habit_stats = await db.get(HabitStats, habit_id)
+    total_checkins = habit_stats.total_checkins if habit_stats else 0
+    completed_checkins = habit_stats.completed_checkins if habit_stats else 0
 
-    completion_rate = 0.0
-    if total_checkins > 0:
-        completion_rate = round((completed_checkins / total_checkins) * 100, 2)
+    # Отметки в порядке индекса uq_checkins_habit_date, один проход без сортировки
+    result = await db.execute(
+        select(Checkin.checkin_date, Checkin.completed)
+        .where(Checkin.habit_id == habit_id)
+        .order_by(Checkin.checkin_date)
+    )
+    adherence = compute_adherence(habit.periodicity, result.all(), date.today())
 
-    return {
-        "habit_id": habit_id,
-        "habit_name": habit.name,
-        "total_checkins": total_checkins,
-        "completed_checkins": completed_checkins,
-        "completion_rate": completion_rate,
-        "periodicity": habit.periodicity,
-    }
+    return HabitStatsResponse(
+        habit_id=habit_id,
+        habit_name=habit.name_html,
+        periodicity=habit.periodicity,
+        total_checkins=total_checkins,
+        completed_checkins=completed_checkins,
+        completion_rate=completion_rate(total_checkins, completed_checkins),
+        **adherence,
+    )
@@ -0,0 +1,304 @@
+"""
+Метрики в формате Prometheus без внешних зависимостей.
+
+Каждый поток пишет в свой шард (threading.local), поэтому наблюдение
+не берет блокировок; шарды суммируются только при чтении /metrics.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy import event
+
+from .database import TimedCheckoutPool, statement_fingerprint
+
+# Границы гистограмм в секундах; 0.2 - порог p95 из NFR-01
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.5, 1.0, 2.5, 5.0)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+# Потолок числа отпечатков запросов, остальные попадают в "other"
+MAX_STATEMENT_SERIES = 200
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# /metrics требует заголовок Authorization: Bearer <token>; без токена - 404
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """Данные метрики, разложенные по потокам"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _snapshots(self) -> Iterable[dict]:
+        with self._lock:
+            shards = list(self._shards)
+        # dict.copy() атомарен под GIL, пишущий поток не мешает чтению
+        return [shard.copy() for shard in shards]
+
+    def clear(self) -> None:
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+
+class Counter(_Sharded):
+    """Счетчик; с отрицательными приращениями работает как gauge"""
+
+    def __init__(self, name, documentation, labelnames=(), kind="counter"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[tuple, float]:
+        merged: Dict[tuple, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for labels, value in sorted(self.values().items()):
+            lines.append(
+                f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            )
+        return lines
+
+
+class Histogram(_Sharded):
+    """Гистограмма: счетчики по корзинам плюс сумма наблюдений"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: tuple, value: float) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # Корзины, +Inf и сумма в последнем элементе
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def values(self) -> Dict[tuple, list]:
+        merged: Dict[tuple, list] = {}
+        for shard in self._snapshots():
+            for labels, series in shard.items():
+                total = merged.setdefault(labels, [0] * len(series[:-1]) + [0.0])
+                for i, value in enumerate(list(series)):
+                    total[i] += value
+        return merged
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, series in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, labels, le)} "
+                    f"{cumulative}"
+                )
+            label_text = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, float]]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector) -> None:
+        """collector() возвращает (имя, тип, описание, значение) при чтении"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, kind, documentation, value in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+http_requests_in_flight = registry.register(
+    Counter(
+        "http_requests_in_flight",
+        "HTTP requests currently being served",
+        kind="gauge",
+    )
+)
+http_request_duration_seconds = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template",
+        ("method", "route"),
+    )
+)
+http_responses_total = registry.register(
+    Counter(
+        "http_responses_total",
+        "HTTP responses by route template and status",
+        ("method", "route", "status"),
+    )
+)
+db_statement_duration_seconds = registry.register(
+    Histogram(
+        "db_statement_duration_seconds",
+        "Cursor execution time by statement fingerprint",
+        ("statement",),
+        DB_BUCKETS,
+    )
+)
+db_pool_checkout_seconds = registry.register(
+    Histogram(
+        "db_pool_checkout_seconds",
+        "Time to obtain a connection from the pool",
+        ("engine",),
+        DB_BUCKETS,
+    )
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: время ответа, статусы и запросы в обработке"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.inc(amount=-1)
+            route = scope.get("route")
+            # Шаблон пути, а не сам путь: число серий не растет с числом id
+            labels = (scope["method"], route.path if route else "unmatched")
+            http_request_duration_seconds.observe(labels, time.perf_counter() - started)
+            http_responses_total.inc(labels + (status,))
+
+
+def instrument_engine(sync_engine, name: str) -> None:
+    """Подключает замеры запросов и ожидания пула к движку"""
+    seen_statements = set()
+
+    def record(statement: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        fingerprint = statement_fingerprint(statement)
+        if fingerprint not in seen_statements:
+            if len(seen_statements) >= MAX_STATEMENT_SERIES:
+                fingerprint = "other"
+            else:
+                seen_statements.add(fingerprint)
+        db_statement_duration_seconds.observe((fingerprint,), elapsed)
+
+    # События диалекта do_execute* дешевле before/after_cursor_execute:
+    # те переводят каждое выполнение на медленный путь диспетчеризации
+    # Connection. Обработчик сам вызывает метод диалекта и возвращает True
+    @event.listens_for(sync_engine, "do_execute")
+    def timed_execute(cursor, statement, parameters, context):
+        started = time.perf_counter()
+        try:
+            context.dialect.do_execute(cursor, statement, parameters, context)
+        finally:
+            record(statement, started)
+        return True
+
+    @event.listens_for(sync_engine, "do_executemany")
+    def timed_executemany(cursor, statement, parameters, context):
+        started = time.perf_counter()
+        try:
+            context.dialect.do_executemany(cursor, statement, parameters, context)
+        finally:
+            record(statement, started)
+        return True
+
+    @event.listens_for(sync_engine, "do_execute_no_params")
+    def timed_execute_no_params(cursor, statement, context):
+        started = time.perf_counter()
+        try:
+            context.dialect.do_execute_no_params(cursor, statement, context)
+        finally:
+            record(statement, started)
+        return True
+
+    # Ожидание соединения видно только пулу из database.timed_pool_class
+    pool = sync_engine.pool
+    if isinstance(pool, TimedCheckoutPool):
+        pool.checkout_observers.append(
+            lambda elapsed: db_pool_checkout_seconds.observe((name,), elapsed)
+        )
@@ -0,0 +1,158 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import ExitStack
+from typing import Hashable, Optional
+
+# Заголовок: магическое число, версия формата, число слотов
+# и счетчик занятых слотов (меняется, поэтому не входит в проверку разметки)
+LAYOUT = struct.Struct("<8sIQ")
+OCCUPIED = struct.Struct("<Q")
+HEADER_SIZE = LAYOUT.size + OCCUPIED.size
+MAGIC = b"HTRLGCRA"
+FORMAT_VERSION = 2
+# Слот: 64-битный хеш ключа и TAT (unix time)
+SLOT = struct.Struct("<Qd")
+# Ключ ищется только в своем окне из PROBE_WINDOW соседних слотов
+PROBE_WINDOW = 8
+THREAD_LOCKS = 64
+
+
+def key_hash(key: Hashable) -> int:
+    """Стабильный между процессами хеш ключа (hash() рандомизирован)"""
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class MmapBucketStore:
+    """
+    Хранилище GCRA в общем memory-mapped файле для всех воркеров хоста.
+
+    Файл - хеш-таблица фиксированного размера из слотов (хеш ключа, TAT).
+    Ключ живет в одном окне из PROBE_WINDOW слотов; окно блокируется
+    fcntl-блокировкой на свой диапазон байт (между процессами) и
+    threading.Lock (между потоками процесса), поэтому чтение и запись
+    TAT атомарны. Слот с TAT в прошлом свободен; если свободных нет,
+    вытесняется ключ с самым ранним TAT - память не растет никогда.
+    Число занятых слотов хранится в заголовке, чтобы len() не сканировал
+    таблицу.
+    """
+
+    def __init__(self, path: str, slots: int, clock=time.time):
+        self.windows = max(1, slots // PROBE_WINDOW)
+        self.slots = self.windows * PROBE_WINDOW
+        # Версия формата и размер в имени: воркеры с другой разметкой
+        # открывают свой файл и не меняют размер чужого отображения (SIGBUS)
+        self.path = f"{path}.v{FORMAT_VERSION}.{self.slots}"
+        self.size = HEADER_SIZE + self.slots * SLOT.size
+        self.clock = clock
+        self.evicted = 0  # в пределах текущего процесса
+        self._thread_locks = [threading.Lock() for _ in range(THREAD_LOCKS)]
+        self._counter_lock = threading.Lock()
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            self._init_file()
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._mm = mmap.mmap(self._fd, self.size)
+
+    def _init_file(self) -> None:
+        expected = LAYOUT.pack(MAGIC, FORMAT_VERSION, self.slots)
+        if os.fstat(self._fd).st_size == 0:
+            # Новый файл размечается один раз под блокировкой всего файла
+            os.ftruncate(self._fd, self.size)
+            os.pwrite(self._fd, expected, 0)
+            return
+        header = os.pread(self._fd, LAYOUT.size, 0)
+        if header != expected or os.fstat(self._fd).st_size != self.size:
+            # Файл может быть отображен другими процессами: не трогаем его
+            raise RuntimeError(
+                f"Rate limit file {self.path} has an unexpected layout; "
+                f"remove it after stopping all workers"
+            )
+
+    def acquire(self, key: Hashable, count: int, period: float) -> Optional[float]:
+        """
+        Забирает один токен. Возвращает None, если запрос разрешен,
+        иначе - через сколько секунд появится следующий токен.
+        """
+        interval = period / count
+        hashed = key_hash(key)
+        window = hashed % self.windows
+        start = HEADER_SIZE + window * PROBE_WINDOW * SLOT.size
+        length = PROBE_WINDOW * SLOT.size
+        mm = self._mm
+
+        with self._thread_locks[window % THREAD_LOCKS]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                now = self.clock()
+                target = None
+                target_hash = None
+                target_tat = None
+                for offset in range(start, start + length, SLOT.size):
+                    slot_hash, tat = SLOT.unpack_from(mm, offset)
+                    if slot_hash == hashed:
+                        target, target_hash, target_tat = offset, slot_hash, tat
+                        break
+                    if target_tat is None or tat < target_tat:
+                        target, target_hash, target_tat = offset, slot_hash, tat
+                else:
+                    # Ключа нет: занимаем слот с самым ранним TAT
+                    if target_tat > now:
+                        self.evicted += 1
+                    target_tat = now
+
+                new_tat = max(target_tat, now) + interval
+                if new_tat - now > period:
+                    return new_tat - period - now
+                if target_hash == 0:
+                    self._add_occupied()
+                SLOT.pack_into(mm, target, hashed, new_tat)
+                return None
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _add_occupied(self) -> None:
+        """Учитывает занятый пустой слот; вызывается под блокировкой окна"""
+        with self._counter_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, OCCUPIED.size, LAYOUT.size)
+            try:
+                (occupied,) = OCCUPIED.unpack_from(self._mm, LAYOUT.size)
+                OCCUPIED.pack_into(self._mm, LAYOUT.size, occupied + 1)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, OCCUPIED.size, LAYOUT.size)
+
+    def __len__(self) -> int:
+        """Число занятых слотов (ключей с момента разметки или clear)"""
+        with self._counter_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_SH, OCCUPIED.size, LAYOUT.size)
+            try:
+                (occupied,) = OCCUPIED.unpack_from(self._mm, LAYOUT.size)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, OCCUPIED.size, LAYOUT.size)
+        return occupied
+
+    def clear(self) -> None:
+        # fcntl-блокировки принадлежат процессу: снятие блокировки всего файла
+        # сняло бы и блокировки окон, которые держат другие потоки. Поэтому
+        # сначала ждем, пока все потоки процесса выйдут из acquire
+        with ExitStack() as stack:
+            for lock in self._thread_locks:
+                stack.enter_context(lock)
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                # Слоты и счетчик занятых слотов обнуляются вместе
+                self._mm[LAYOUT.size : self.size] = bytes(self.size - LAYOUT.size)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
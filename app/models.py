@@ -1,8 +1,40 @@
-from sqlalchemy import Boolean, Column, Date, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+from typing import List
+
+from markupsafe import escape
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    bindparam,
+    delete,
+    func,
+    inspect,
+    select,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy.schema import CreateColumn
 
 from .database import Base
 
+# Строк за один проход заполнения habits.name_html в старой базе
+NAME_BACKFILL_BATCH = 1000
+
+
+def html_name(name: str) -> str:
+    """Название привычки, экранированное для вывода в HTML"""
+    return str(escape(name))
+
+
+def _default_name_html(context) -> str:
+    """name_html для Core-вставок в обход ORM"""
+    return html_name(context.get_current_parameters()["name"])
+
 
 class User(Base):
     __tablename__ = "users"
@@ -24,14 +56,24 @@ class Habit(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
+    # Экранированное название: считается один раз при записи, а не на каждом
+    # чтении; каждый символ может превратиться в сущность до 5 символов
+    name_html = Column(String(500), default=_default_name_html)
     periodicity = Column(Integer, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
 
     user = relationship("User", back_populates="habits")
     checkins = relationship(
         "Checkin", back_populates="habit", cascade="all, delete-orphan"
     )
 
+    @validates("name")
+    def _set_name_html(self, key, name):
+        # Присваивание name через ORM (создание и переименование) сразу
+        # пересчитывает экранированную копию
+        self.name_html = html_name(name)
+        return name
+
     def __repr__(self):
         return (
             f"<Habit(id={self.id}, name='{self.name}', periodicity={self.periodicity})>"
@@ -40,10 +82,14 @@ class Habit(Base):
 
 class Checkin(Base):
     __tablename__ = "checkins"
+    __table_args__ = (
+        # Одна отметка на привычку в день; индекс также обслуживает выборки по habit_id
+        Index("uq_checkins_habit_date", "habit_id", "checkin_date", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     habit_id = Column(Integer, ForeignKey("habits.id"), nullable=False)
-    checkin_date = Column(Date, nullable=False)
+    checkin_date = Column(Date, nullable=False, index=True)
     completed = Column(Boolean, default=False, nullable=False)
 
     habit = relationship("Habit", back_populates="checkins")
@@ -54,3 +100,128 @@ def __repr__(self):
         f"<Checkin(id={self.id}, habit_id={self.habit_id}, "
         f"date={self.checkin_date}, completed={self.completed})>"
     )
+
+
+class UserStats(Base):
+    """Агрегаты пользователя, обновляются вместе с привычками и отметками"""
+
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_habits = Column(Integer, default=0, nullable=False)
+    total_checkins = Column(Integer, default=0, nullable=False)
+    completed_checkins = Column(Integer, default=0, nullable=False)
+    # Растет при каждой записи пользователя, источник ETag
+    data_version = Column(Integer, default=0, nullable=False)
+
+
+class HabitStats(Base):
+    """Агрегаты привычки, обновляются вместе с отметками"""
+
+    __tablename__ = "habit_stats"
+
+    habit_id = Column(Integer, ForeignKey("habits.id"), primary_key=True)
+    total_checkins = Column(Integer, default=0, nullable=False)
+    completed_checkins = Column(Integer, default=0, nullable=False)
+
+
+def create_missing_indexes(connection) -> None:
+    """
+    Создает индексы, отсутствующие в уже существующих таблицах.
+    create_all() добавляет индексы только вместе с новыми таблицами.
+
+    Каждый индекс создается в своей транзакции: уникальный индекс, который
+    не строится из-за дублей, не откатывает остальные. connection не должен
+    быть внутри транзакции.
+    """
+    with connection.begin():
+        existing_tables = set(inspect(connection).get_table_names())
+    blocked = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            try:
+                with connection.begin():
+                    index.create(connection, checkfirst=True)
+            except IntegrityError:
+                blocked.append(f"{index.name} ({table.name})")
+    if blocked:
+        raise RuntimeError(
+            f"Cannot create unique indexes {', '.join(blocked)}: duplicate rows. "
+            f"Remove them first, for checkins: "
+            f"python -m app.aggregates --dedupe-checkins"
+        )
+
+
+def dedupe_checkins(connection) -> int:
+    """
+    Оставляет одну отметку на привычку и день (последнюю по id), чтобы
+    построить uq_checkins_habit_date в старой базе. Агрегаты после этого
+    нужно пересчитать.
+    """
+    keep = select(func.max(Checkin.id)).group_by(Checkin.habit_id, Checkin.checkin_date)
+    result = connection.execute(delete(Checkin).where(Checkin.id.not_in(keep)))
+    return result.rowcount
+
+
+def create_missing_columns(connection) -> None:
+    """
+    Добавляет в существующие таблицы столбцы, появившиеся в моделях.
+    Новые столбцы должны допускать NULL: строки уже есть в таблице.
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+
+def backfill_habit_names(connection) -> int:
+    """Заполняет name_html у привычек, созданных до его появления"""
+    filled = 0
+    while True:
+        rows = connection.execute(
+            select(Habit.id, Habit.name)
+            .where(Habit.name_html.is_(None))
+            .limit(NAME_BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            return filled
+        connection.execute(
+            update(Habit).where(Habit.id == bindparam("habit_id")),
+            [
+                {"habit_id": habit_id, "name_html": html_name(name)}
+                for habit_id, name in rows
+            ],
+        )
+        filled += len(rows)
+
+
+def pending_migrations(connection) -> List[str]:
+    """Объекты схемы из моделей, которых еще нет в базе"""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    pending = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            pending.append(f"table {table.name}")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        pending.extend(
+            f"column {table.name}.{column.name}"
+            for column in table.columns
+            if column.name not in columns
+        )
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        pending.extend(
+            f"index {index.name}"
+            for index in table.indexes
+            if index.name not in indexes
+        )
+    return pending
@@ -0,0 +1,52 @@
+import base64
+import binascii
+import json
+from typing import Any, Callable, List, Sequence
+
+from .errorsRFC7807 import ApiError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Кодирует ключ последней строки страницы в непрозрачный курсор
+    """
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, converters: Sequence[Callable]) -> List[Any]:
+    """
+    Декодирует курсор и приводит его значения к типам ключа сортировки
+
+    Args:
+        cursor: Курсор из параметра after
+        converters: Функции приведения для каждого поля ключа
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(converters):
+            raise ValueError("cursor shape mismatch")
+        return [convert(value) for convert, value in zip(converters, values)]
+    except (binascii.Error, TypeError, ValueError):
+        raise ApiError(
+            code="INVALID_CURSOR",
+            message="Invalid pagination cursor",
+            status=400,
+        )
+
+
+def build_page(rows: Sequence[Any], limit: int, cursor_key: Callable) -> dict:
+    """
+    Формирует страницу из limit + 1 строк: лишняя строка означает,
+    что за страницей есть продолжение
+    """
+    items = list(rows[:limit])
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(*cursor_key(items[-1]))
+
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.context import CryptContext
+
+# Модуль импортируется в рабочих процессах пула, поэтому
+# не тянет за собой FastAPI и настройку БД
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))
+)
+PASSWORD_HASH_MAX_QUEUE = int(
+    os.getenv("PASSWORD_HASH_MAX_QUEUE", str(PASSWORD_HASH_WORKERS * 8))
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Очередь хеширования заполнена, запрос нужно отклонить"""
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _timed(func, submitted_at: float, *args):
+    """Выполняется в рабочем процессе: замеряет ожидание в очереди и время bcrypt"""
+    started_at = time.time()
+    started = time.perf_counter()
+    result = func(*args)
+    return result, started_at - submitted_at, time.perf_counter() - started
+
+
+class PasswordHasher:
+    """
+    Пул процессов для bcrypt с ограниченной очередью.
+    Логины не занимают потоки threadpool, а при перегрузке
+    запросы отклоняются сразу, а не копятся.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.pool_restarts = 0
+        self.queue_wait_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            executor = self._executor
+
+        try:
+            loop = asyncio.get_running_loop()
+            result, queue_wait, hash_time = await loop.run_in_executor(
+                executor, _timed, func, time.time(), *args
+            )
+        except BrokenProcessPool:
+            # Рабочий процесс погиб (например, OOM killer): такой пул больше
+            # не принимает задачи, поэтому следующий вызов создаст новый
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+                    self.pool_restarts += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise PasswordHasherBusy()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        with self._lock:
+            self.completed += 1
+            self.queue_wait_seconds += queue_wait
+            self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, queue_wait)
+            self.hash_seconds += hash_time
+
+        return result
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "pool_restarts": self.pool_restarts,
+            "avg_queue_wait_ms": round(self.queue_wait_seconds / completed * 1000, 3),
+            "max_queue_wait_ms": round(self.max_queue_wait_seconds * 1000, 3),
+            "avg_hash_ms": round(self.hash_seconds / completed * 1000, 3),
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
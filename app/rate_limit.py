@@ -1,18 +1,118 @@
+import asyncio
+import functools
+import inspect
+import math
+import os
+
 from fastapi import Request
 from fastapi.responses import JSONResponse
-from slowapi import Limiter
-from slowapi.errors import RateLimitExceeded
-from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address, default_limits=["50/minute"])
+from .token_bucket import TokenBucketStore, parse_rate
+
+# memory - счетчики в памяти процесса, mmap - общие для всех воркеров хоста
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+RATE_LIMIT_MMAP_PATH = os.getenv(
+    "RATE_LIMIT_MMAP_PATH", "/dev/shm/habit-tracker-rate-limit"
+)
+
+
+class RateLimitExceeded(Exception):
+    """Лимит запросов исчерпан"""
+
+    def __init__(self, rate: str, retry_after: float):
+        self.rate = rate
+        self.retry_after = retry_after
+
+
+def get_remote_address(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+
+class Limiter:
+    """
+    Лимиты запросов на эндпоинт в памяти процесса (GCRA).
+    Используется как декоратор: @limiter.limit("50/minute").
+    """
+
+    def __init__(self, key_func, store: TokenBucketStore):
+        self.key_func = key_func
+        self.store = store
+        self.rejected = 0
+
+    def check(self, scope: str, request: Request, rate: str, count: int, period):
+        retry_after = self.store.acquire((scope, self.key_func(request)), count, period)
+        if retry_after is not None:
+            self.rejected += 1
+            raise RateLimitExceeded(rate, retry_after)
+
+    def limit(self, rate: str):
+        count, period = parse_rate(rate)
+
+        def decorator(func):
+            if "request" not in inspect.signature(func).parameters:
+                raise TypeError(
+                    f"{func.__qualname__} must accept 'request: Request' to be limited"
+                )
+            scope = f"{func.__module__}.{func.__qualname__}"
+
+            if asyncio.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    self.check(scope, kwargs["request"], rate, count, period)
+                    return await func(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def sync_wrapper(*args, **kwargs):
+                self.check(scope, kwargs["request"], rate, count, period)
+                return func(*args, **kwargs)
+
+            return sync_wrapper
+
+        return decorator
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self.store),
+            "evicted": self.store.evicted,
+            "rejected": self.rejected,
+        }
+
+    def reset(self) -> None:
+        self.store.clear()
+        self.rejected = 0
+
+
+def create_store(storage: str = RATE_LIMIT_STORAGE):
+    """Создает хранилище счетчиков по имени бэкенда"""
+    if storage == "memory":
+        return TokenBucketStore(RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHARDS)
+    if storage == "mmap":
+        # fcntl есть только на POSIX, поэтому импорт по требованию
+        from .mmap_bucket import MmapBucketStore
+
+        return MmapBucketStore(RATE_LIMIT_MMAP_PATH, RATE_LIMIT_MAX_KEYS)
+    raise ValueError(f"Unknown RATE_LIMIT_STORAGE: {storage!r}")
+
+
+limiter = Limiter(
+    key_func=get_remote_address,
+    store=TokenBucketStore(RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHARDS),
+)
 
 
-def init_rate_limiting(app):
+def init_rate_limiting(app, store=None):
     """
     Инициализация Rate Limiting для FastAPI приложения.
-    Применяет глобальный лимит и кастомный обработчик ошибок.
+    Подключает хранилище счетчиков, лимитер и кастомный обработчик ошибок.
     """
 
+    if store is not None or RATE_LIMIT_STORAGE != "memory":
+        limiter.store = store if store is not None else create_store()
     app.state.limiter = limiter  # Подключаем лимитер к приложению
 
     # Кастомный обработчик RateLimitExceeded с JSON-ответом
@@ -26,6 +126,7 @@ def init_rate_limiting(app):
                     "message": "Too many requests. Try again later.",
                 }
             },
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
         )
 
     return app
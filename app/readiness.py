@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from fastapi import Response
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import pending_migrations
+
+READINESS_PROBE_INTERVAL_SECONDS = float(
+    os.getenv("READINESS_PROBE_INTERVAL_SECONDS", "5")
+)
+READINESS_PROBE_TIMEOUT_SECONDS = float(
+    os.getenv("READINESS_PROBE_TIMEOUT_SECONDS", "2")
+)
+
+LIVE_BODY = b'{"status":"alive"}'
+
+
+def pool_occupancy(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    occupancy = {"class": type(pool).__name__}
+    # NullPool и StaticPool не держат счетчиков соединений
+    if hasattr(pool, "checkedout"):
+        occupancy.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return occupancy
+
+
+class ReadinessProbe:
+    """
+    Проверка готовности в фоне с фиксированным интервалом.
+
+    /health/ready отдает последний готовый результат, уже сериализованный
+    в байты, поэтому опрос оркестратором не нагружает БД. Если результат
+    старше трех интервалов (фоновая задача не работает), сервис не готов.
+    """
+
+    def __init__(self, engine: AsyncEngine, interval: float, timeout: float):
+        self.engine = engine
+        self.interval = interval
+        self.timeout = timeout
+        self.checked_at = None
+        self._status_code = 503
+        self._body = json.dumps({"status": "starting"}).encode()
+        self._task = None
+
+    async def _check_database(self) -> tuple:
+        started = time.perf_counter()
+        async with self.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            latency = time.perf_counter() - started
+            pending = await connection.run_sync(pending_migrations)
+        return latency, pending
+
+    async def refresh(self) -> None:
+        pool = pool_occupancy(self.engine)
+        try:
+            latency, pending = await asyncio.wait_for(
+                self._check_database(), self.timeout
+            )
+            database = {"status": "ok", "latency_ms": round(latency * 1000, 3)}
+        except Exception as e:
+            database = {"status": "error", "error": str(e) or type(e).__name__}
+            pending = None
+
+        ready = database["status"] == "ok" and not pending
+        report = {
+            "status": "ready" if ready else "not_ready",
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "database": database,
+            "pool": pool,
+            "migrations": {"pending": pending},
+        }
+        self._body = json.dumps(report).encode()
+        self._status_code = 200 if ready else 503
+        self.checked_at = time.monotonic()
+
+    def response(self) -> Response:
+        if (
+            self.checked_at is not None
+            and time.monotonic() - self.checked_at > 3 * self.interval
+        ):
+            return Response(
+                content=json.dumps({"status": "stale"}),
+                status_code=503,
+                media_type="application/json",
+            )
+        return Response(
+            content=self._body,
+            status_code=self._status_code,
+            media_type="application/json",
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import List
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -20,12 +20,45 @@ class HabitResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class HabitPage(BaseModel):
+    """Страница привычек с курсором на следующую"""
+
+    items: List[HabitResponse]
+    next_cursor: Optional[str] = None
+
+
 class CheckinCreate(BaseModel):
     habit_id: int = Field(..., gt=0, description="ID привычки")
     checkin_date: date = Field(..., description="Дата отметки")
     completed: bool = Field(..., description="Выполнено (да/нет)")
 
 
+MAX_CHECKIN_BATCH_SIZE = 500
+
+
+class CheckinBatchCreate(BaseModel):
+    """Пакет отметок для синхронизации офлайн-клиента"""
+
+    items: List[CheckinCreate] = Field(
+        ..., min_length=1, max_length=MAX_CHECKIN_BATCH_SIZE
+    )
+
+
+class CheckinBatchItemResult(BaseModel):
+    """Результат обработки одной отметки из пакета"""
+
+    index: int
+    status: Literal["created", "duplicate", "not_found"]
+    id: Optional[int] = None
+
+
+class CheckinBatchResponse(BaseModel):
+    created: int
+    duplicate: int
+    not_found: int
+    results: List[CheckinBatchItemResult]
+
+
 class CheckinResponse(BaseModel):
     id: int
     habit_id: int
@@ -35,6 +68,13 @@ class CheckinResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CheckinPage(BaseModel):
+    """Страница отметок с курсором на следующую"""
+
+    items: List[CheckinResponse]
+    next_cursor: Optional[str] = None
+
+
 class StatsResponse(BaseModel):
     total_habits: int
     total_checkins: int
@@ -42,6 +82,27 @@ class StatsResponse(BaseModel):
     completion_rate: float
 
 
+class HabitStatsSummary(BaseModel):
+    """Счетчики отметок привычки"""
+
+    habit_id: int
+    habit_name: str
+    periodicity: int
+    total_checkins: int
+    completed_checkins: int
+    completion_rate: float
+
+
+class HabitStatsResponse(HabitStatsSummary):
+    """Статистика привычки с учетом ее периодичности"""
+
+    expected_completions: int
+    actual_completions: int
+    adherence_rate: float
+    current_streak: int
+    longest_streak: int
+
+
 class HabitWithCheckins(HabitResponse):
     """Схема привычки с списком отметок"""
 
@@ -0,0 +1,79 @@
+"""
+Быстрая сериализация списков (FAST_SERIALIZATION=true).
+
+Списочные эндпоинты читают строки кортежами (select по столбцам, без
+ORM-объектов) и собирают словари. В обычном режиме FastAPI проверяет
+их по response_model и кодирует stdlib json. В быстром режиме ответ
+сразу кодирует orjson: типы столбцов БД уже совпадают со схемой, поэтому
+повторная проверка каждой строки pydantic не нужна.
+"""
+
+import os
+from typing import List
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from .models import Checkin, Habit
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() == "true"
+
+if FAST_SERIALIZATION:
+    # orjson нужен только в быстром режиме, поэтому импорт по требованию
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+else:
+    DefaultResponse = JSONResponse
+
+# Столбцы HabitResponse и CheckinResponse для выборок без ORM-объектов;
+# в ответах название привычки всегда экранированное
+HABIT_COLUMNS = (
+    Habit.id,
+    Habit.name_html.label("name"),
+    Habit.periodicity,
+    Habit.user_id,
+)
+CHECKIN_COLUMNS = (
+    Checkin.id,
+    Checkin.habit_id,
+    Checkin.checkin_date,
+    Checkin.completed,
+)
+
+# Заголовки ответа-заготовки, которые пересчитывает новый ответ
+_RENDERED_HEADERS = {b"content-length", b"content-type"}
+
+
+def rows_as_dicts(result) -> List[dict]:
+    """Строки результата select(...) в словари по именам столбцов"""
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def habit_response(habit: Habit) -> dict:
+    """HabitResponse из ORM-объекта без изменения его состояния"""
+    return {
+        "id": habit.id,
+        "name": habit.name_html,
+        "periodicity": habit.periodicity,
+        "user_id": habit.user_id,
+    }
+
+
+def trusted_response(content, response: Response):
+    """
+    Отдает content без проверки по response_model в быстром режиме.
+
+    content должен состоять из значений, прочитанных из БД. Заголовки,
+    выставленные зависимостями (ETag, Cache-Control), переносятся
+    в готовый ответ. В обычном режиме content возвращается как есть.
+    """
+    if not FAST_SERIALIZATION:
+        return content
+
+    rendered = DefaultResponse(content, status_code=response.status_code or 200)
+    rendered.raw_headers.extend(
+        (name, value)
+        for name, value in response.raw_headers
+        if name not in _RENDERED_HEADERS
+    )
+    return rendered
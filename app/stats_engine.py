@@ -0,0 +1,70 @@
+from datetime import date
+from typing import Iterable, Tuple
+
+
+def completion_rate(total: int, completed: int) -> float:
+    """Доля выполненных отметок в процентах"""
+    if total <= 0:
+        return 0.0
+    return round((completed / total) * 100, 2)
+
+
+def compute_adherence(
+    periodicity: int, checkins: Iterable[Tuple[date, bool]], as_of: date
+) -> dict:
+    """
+    Считает соблюдение привычки с учетом периодичности за один проход.
+
+    Время делится на периоды по periodicity дней, начиная с первой отметки.
+    Период выполнен, если в нем есть хотя бы одна выполненная отметка.
+    Текущий период еще не закончился, поэтому серия не прерывается,
+    пока не выполнен только он.
+
+    Args:
+        periodicity: Длина периода в днях
+        checkins: Пары (дата, выполнено), отсортированные по дате
+        as_of: Дата, на которую считается статистика
+    """
+    anchor = None
+    last_date = None
+    last_period = -2
+    run = 0
+    longest = 0
+    actual = 0
+
+    for checkin_date, completed in checkins:
+        day = checkin_date.toordinal()
+        if anchor is None:
+            anchor = day
+        last_date = checkin_date
+        if not completed:
+            continue
+
+        period = (day - anchor) // periodicity
+        if period == last_period:
+            continue
+        run = run + 1 if period == last_period + 1 else 1
+        if run > longest:
+            longest = run
+        last_period = period
+        actual += 1
+
+    if anchor is None:
+        return {
+            "expected_completions": 0,
+            "actual_completions": 0,
+            "adherence_rate": 0.0,
+            "current_streak": 0,
+            "longest_streak": 0,
+        }
+
+    current_period = (max(as_of, last_date).toordinal() - anchor) // periodicity
+    expected = current_period + 1
+
+    return {
+        "expected_completions": expected,
+        "actual_completions": actual,
+        "adherence_rate": round(actual / expected * 100, 2),
+        "current_streak": run if last_period >= current_period - 1 else 0,
+        "longest_streak": longest,
+    }
@@ -0,0 +1,167 @@
+"""
+Структурированные JSON-логи без блокировки потоков запросов.
+
+Запись попадает в ограниченную очередь (QueueHandler), а форматирование
+и вывод выполняет фоновый поток QueueListener. При переполнении очереди
+запись отбрасывается и учитывается в dropped. Повторяющиеся события
+(например, неудачные логины при переборе паролей) прореживаются:
+за окно проходят первые LOG_SAMPLE_BURST записей каждого события,
+а число пропущенных попадает в поле suppressed следующей записи.
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "10"))
+LOG_SAMPLE_WINDOW_SECONDS = float(os.getenv("LOG_SAMPLE_WINDOW_SECONDS", "60"))
+
+# Атрибуты LogRecord, которые не нужно дублировать в JSON
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "fields", "sample_key"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", None) or {})
+        payload.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in _RESERVED and not key.startswith("_")
+        )
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Прореживает записи с атрибутом sample_key (одно окно на событие)"""
+
+    def __init__(self, burst: int, window_seconds: float, clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample_key", None)
+        if key is None:
+            return True
+
+        with self._lock:
+            now = self.clock()
+            started, passed, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.window_seconds:
+                started, passed = now, 0
+            if passed >= self.burst:
+                self._windows[key] = (started, passed, suppressed + 1)
+                return False
+            self._windows[key] = (started, passed + 1, 0)
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не ждет места в очереди и не форматирует запись"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматирование JSON и traceback выполняется в фоновом потоке
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLogging:
+    """Подключает очередь к логгеру app и управляет фоновым потоком"""
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+
+    def start(self, stream=None, level: str = LOG_LEVEL) -> None:
+        if self.listener is not None:
+            return
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+
+        self.handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        self.handler.addFilter(
+            SamplingFilter(LOG_SAMPLE_BURST, LOG_SAMPLE_WINDOW_SECONDS)
+        )
+        self.listener = logging.handlers.QueueListener(self.handler.queue, output)
+
+        root = logging.getLogger("app")
+        root.setLevel(level)
+        root.addHandler(self.handler)
+        root.propagate = False
+        self.listener.start()
+
+    def stop(self) -> None:
+        """Дописывает очередь и останавливает фоновый поток"""
+        if self.listener is None:
+            return
+        logging.getLogger("app").removeHandler(self.handler)
+        self.listener.stop()
+        self.listener = None
+
+    def stats(self) -> dict:
+        return {"dropped": self.handler.dropped if self.handler else 0}
+
+
+structured_logging = StructuredLogging()
+
+
+def log_event(
+    logger: logging.Logger,
+    level: int,
+    event: str,
+    sample: bool = False,
+    **fields,
+) -> None:
+    """
+    Пишет событие с произвольными полями.
+
+    Args:
+        logger: Логгер модуля
+        level: Уровень logging
+        event: Имя события, оно же ключ прореживания
+        sample: Прореживать ли повторы события
+        **fields: Поля записи
+    """
+    if logger.isEnabledFor(level):
+        extra = {"fields": fields}
+        if sample:
+            extra["sample_key"] = event
+        logger.log(level, event, extra=extra)
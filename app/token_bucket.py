@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+PERIODS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Разбирает лимит вида "50/minute" в (количество, период в секундах)"""
+    count, _, period = rate.partition("/")
+    period = period.strip().lower().removesuffix("s")
+    if period not in PERIODS or not count.strip().isdigit() or int(count) <= 0:
+        raise ValueError(f"Invalid rate limit: {rate!r}")
+    return int(count), float(PERIODS[period])
+
+
+class TokenBucketStore:
+    """
+    Хранилище GCRA (token bucket) с фиксированным потолком памяти.
+
+    Для каждого ключа хранится одно число - теоретическое время прихода
+    следующего запроса (TAT). Проверка O(1). Ключи разнесены по шардам
+    с отдельными блокировками, внутри шарда - LRU: при превышении потолка
+    вытесняются самые давно неактивные ключи.
+    """
+
+    def __init__(self, max_keys: int, shards: int = 16, clock=time.monotonic):
+        self.shards = shards
+        self.max_keys_per_shard = max(1, max_keys // shards)
+        self.clock = clock
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._buckets = [OrderedDict() for _ in range(shards)]
+        self.evicted = 0
+
+    def acquire(self, key: Hashable, count: int, period: float) -> Optional[float]:
+        """
+        Забирает один токен. Возвращает None, если запрос разрешен,
+        иначе - через сколько секунд появится следующий токен.
+        """
+        interval = period / count
+        shard = hash(key) % self.shards
+        buckets = self._buckets[shard]
+
+        with self._locks[shard]:
+            now = self.clock()
+            tat = buckets.get(key, now)
+            new_tat = max(tat, now) + interval
+            if new_tat - now > period:
+                return new_tat - period - now
+
+            buckets[key] = new_tat
+            buckets.move_to_end(key)
+            # Ключи с TAT в прошлом эквивалентны полному ведру и не хранят
+            # состояния, поэтому их удаление ничего не меняет
+            while buckets:
+                oldest_key, oldest_tat = next(iter(buckets.items()))
+                if oldest_tat > now and len(buckets) <= self.max_keys_per_shard:
+                    break
+                del buckets[oldest_key]
+                if oldest_tat > now:
+                    self.evicted += 1
+            return None
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets in self._buckets)
+
+    def clear(self) -> None:
+        for lock, buckets in zip(self._locks, self._buckets):
+            with lock:
+                buckets.clear()
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import Depends, Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .auth import get_current_user
+from .auth_cache import Principal
+from .database import get_async_db
+from .models import UserStats
+
+DATA_VERSION_CACHE_TTL_SECONDS = float(os.getenv("DATA_VERSION_CACHE_TTL_SECONDS", "1"))
+DATA_VERSION_CACHE_MAX_ENTRIES = int(
+    os.getenv("DATA_VERSION_CACHE_MAX_ENTRIES", "10000")
+)
+
+
+class NotModified(Exception):
+    """Данные пользователя не изменились с момента выдачи ETag"""
+
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+class DataVersionCache:
+    """
+    Кэш версий данных пользователей в памяти процесса.
+    Записи этого процесса обновляют кэш сразу после commit; записи
+    других воркеров становятся видны не позже чем через TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id: int, version: int) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+data_versions = DataVersionCache(
+    DATA_VERSION_CACHE_MAX_ENTRIES, DATA_VERSION_CACHE_TTL_SECONDS
+)
+
+
+def stage_version(db: AsyncSession, user_id: int, version: int) -> None:
+    """Запоминает новую версию до commit: в кэш она попадет только после него"""
+    db.info.setdefault("data_versions", {})[user_id] = version
+
+
+@event.listens_for(Session, "after_commit")
+def publish_versions(session):
+    for user_id, version in session.info.pop("data_versions", {}).items():
+        data_versions.set(user_id, version)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_versions(session):
+    session.info.pop("data_versions", None)
+
+
+async def get_data_version(db: AsyncSession, user_id: int) -> int:
+    version = data_versions.get(user_id)
+    if version is None:
+        version = await db.scalar(
+            select(UserStats.data_version).where(UserStats.user_id == user_id)
+        )
+        version = version or 0
+        data_versions.set(user_id, version)
+    return version
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Слабое сравнение (RFC 9110): префикс W/ не учитывается
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+) -> None:
+    """
+    Выставляет ETag по версии данных пользователя и отвечает 304
+    до выполнения запросов эндпоинта, если If-None-Match совпал
+    """
+    version = await get_data_version(db, current_user.id)
+    digest = hashlib.blake2b(
+        f"{current_user.id}:{request.url.path}?{request.url.query}".encode(),
+        digest_size=8,
+    ).hexdigest()
+    etag = f'W/"{version}-{digest}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        raise NotModified(etag)
+
+    response.headers["ETag"] = etag
+    # Ответ зависит от токена: общие кэши не должны его переиспользовать
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(
+        status_code=304,
+        headers={"ETag": exc.etag, "Cache-Control": "private, no-cache"},
+    )
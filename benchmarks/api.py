@@ -0,0 +1,698 @@
+"""
+Бенчмарк всех эндпоинтов приложения в одном процессе, без сети.
+
+    python -m benchmarks.api run [--scales 10,1000,100000] [--requests 200]
+        [--concurrency 1] [--output results.json] [--baseline baseline.json]
+    python -m benchmarks.api run --dataset data/load.db [...]
+    python -m benchmarks.api compare baseline.json results.json [--threshold 0.2]
+
+Запросы идут прямо в ASGI-приложение через httpx.ASGITransport, БД -
+временный файл SQLite. Для каждого масштаба заводится пользователь с
+заданным числом отметок, и каждый маршрут app/main.py меряется от его
+имени. Сначала выполняются чтения, затем записи, чтобы записи не меняли
+данные под чтениями. Маршрут без сценария попадает в uncovered.
+
+С --dataset бенчмарк идет на копии базы из benchmarks.seed: меряются
+пользователи с наименьшим, медианным и наибольшим числом отметок.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Масштабы по умолчанию: число отметок у пользователя
+DEFAULT_SCALES = (10, 1_000, 100_000)
+# Дней подряд на привычку при заполнении: 100k отметок дают 100 привычек
+DAYS_PER_HABIT = 1_000
+SEED_START = date(2015, 1, 1)
+# Диапазоны дат для записей бенчмарка, не пересекаются с заполненными
+CREATE_START = date(2030, 1, 1)
+DELETE_START = date(2040, 1, 1)
+BATCH_START = date(2050, 1, 1)
+BATCH_SIZE = 50
+# bcrypt и полная выгрузка медленные: для них меньше повторов
+SLOW_REQUESTS = 20
+PASSWORD = "BenchmarkPassw0rd!"
+ADMIN_KEY = "benchmark-admin-key"
+METRICS_TOKEN = "benchmark-metrics-token"
+MISSING_ID = 999_999_999
+
+# Эталон сравнивается по p95 и пропускной способности
+DEFAULT_THRESHOLD = 0.2
+# Разница p95 меньше этой считается шумом даже при большом отношении
+DEFAULT_MIN_DELTA_MS = 0.5
+
+
+@dataclass
+class Scenario:
+    """
+    Один замеряемый запрос.
+
+    request(i) готовит i-й запрос вне замера и возвращает
+    (метод, URL, аргументы httpx); setup выполняется один раз перед серией.
+    """
+
+    name: str
+    route: str
+    request: Callable[[int], Awaitable[tuple]]
+    status: int = 200
+    max_requests: Optional[int] = None
+    setup: Optional[Callable[[], Awaitable[None]]] = None
+    scale: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        return self.name if self.scale is None else f"{self.name} [{self.scale}]"
+
+
+@dataclass
+class UserContext:
+    username: str
+    password: str
+    scale: int
+    headers: dict
+    habit_id: int
+    checkin_id: int
+    checkin_date: str
+    etags: Dict[str, str] = field(default_factory=dict)
+
+
+def configure_environment(database_path: str) -> None:
+    """Окружение приложения задается до импорта app: движки создаются при импорте"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+    # Неудачные входы из сценариев ошибок пишутся с WARNING
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    os.environ["ADMIN_API_KEY"] = ADMIN_KEY
+    os.environ["METRICS_TOKEN"] = METRICS_TOKEN
+
+
+def seed(scales) -> List[Tuple[str, str, int]]:
+    """Пользователь bench_<N> с N отметками на каждый масштаб"""
+    from sqlalchemy import insert
+
+    from app.aggregates import rebuild_aggregates
+    from app.auth import get_password_hash
+    from app.database import Base, engine
+    from app.models import Checkin, Habit, User
+
+    Base.metadata.create_all(bind=engine)
+    # Один bcrypt-хеш на всех: хеширование дороже самого заполнения
+    password_hash = get_password_hash(PASSWORD)
+
+    with engine.begin() as connection:
+        for scale in scales:
+            user_id = connection.execute(
+                insert(User)
+                .values(username=f"bench_{scale}", password=password_hash)
+                .returning(User.id)
+            ).scalar_one()
+
+            habits = max(1, math.ceil(scale / DAYS_PER_HABIT))
+            rows = []
+            for number in range(habits):
+                habit_id = connection.execute(
+                    insert(Habit)
+                    .values(name=f"Habit {number}", periodicity=1, user_id=user_id)
+                    .returning(Habit.id)
+                ).scalar_one()
+                days = min(DAYS_PER_HABIT, scale - number * DAYS_PER_HABIT)
+                rows.extend(
+                    {
+                        "habit_id": habit_id,
+                        "checkin_date": SEED_START + timedelta(days=day),
+                        "completed": day % 3 != 0,
+                    }
+                    for day in range(days)
+                )
+            connection.execute(insert(Checkin), rows)
+
+        rebuild_aggregates(connection)
+
+    return [(f"bench_{scale}", PASSWORD, scale) for scale in scales]
+
+
+def dataset_accounts() -> List[Tuple[str, str, int]]:
+    """Пользователи набора benchmarks.seed с min, медианой и max отметок"""
+    from sqlalchemy import select
+
+    from app.database import engine
+    from app.models import User, UserStats
+    from benchmarks.seed import SEED_PASSWORD
+
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(User.username, UserStats.total_checkins)
+            .join(UserStats, UserStats.user_id == User.id)
+            .where(UserStats.total_checkins > 0)
+            .order_by(UserStats.total_checkins, User.id)
+        ).all()
+    if not rows:
+        raise SystemExit("Dataset has no users; build it with benchmarks.seed")
+
+    picked = {rows[0], rows[len(rows) // 2], rows[-1]}
+    return [
+        (username, SEED_PASSWORD, checkins)
+        for username, checkins in sorted(picked, key=lambda row: row[1])
+    ]
+
+
+async def prepare_user(client, username: str, password: str, scale: int):
+    response = await client.post(
+        "/login", json={"username": username, "password": password}
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    # Привычка сценариев - та, у которой есть отметки
+    page = (await client.get("/checkins?limit=1", headers=headers)).json()
+    checkin = page["items"][0]
+    return UserContext(
+        username,
+        password,
+        scale,
+        headers,
+        checkin["habit_id"],
+        checkin["id"],
+        checkin["checkin_date"],
+    )
+
+
+def _day(start: date, offset: int) -> str:
+    return (start + timedelta(days=offset)).isoformat()
+
+
+def read_scenarios(client, user: UserContext) -> List[Scenario]:
+    headers = user.headers
+    habit = f"/habits/{user.habit_id}"
+    checkin = f"/checkins/{user.checkin_id}"
+
+    def get(url, **kwargs):
+        async def request(i):
+            return "GET", url, {"headers": headers, **kwargs}
+
+        return request
+
+    async def remember_etag():
+        response = await client.get("/habits", headers=headers)
+        user.etags["/habits"] = response.headers["etag"]
+
+    async def conditional(i):
+        etag = user.etags["/habits"]
+        return "GET", "/habits", {"headers": {**headers, "If-None-Match": etag}}
+
+    return [
+        Scenario("GET /users/me", "GET /users/me", get("/users/me")),
+        Scenario("GET /habits", "GET /habits", get("/habits")),
+        Scenario(
+            "GET /habits (304)",
+            "GET /habits",
+            conditional,
+            status=304,
+            setup=remember_etag,
+        ),
+        Scenario("GET /habits/stats", "GET /habits/stats", get("/habits/stats")),
+        Scenario("GET /habits/{habit_id}", "GET /habits/{habit_id}", get(habit)),
+        Scenario(
+            "GET /habits/{habit_id}/detailed",
+            "GET /habits/{habit_id}/detailed",
+            get(f"{habit}/detailed"),
+        ),
+        Scenario(
+            "GET /habits/{habit_id}/stats",
+            "GET /habits/{habit_id}/stats",
+            get(f"{habit}/stats"),
+        ),
+        # Страница, а не весь список: без limit ответ растет с числом отметок
+        Scenario("GET /checkins", "GET /checkins", get("/checkins?limit=50")),
+        Scenario(
+            "GET /checkins?habit_id",
+            "GET /checkins",
+            get(f"/checkins?habit_id={user.habit_id}&limit=50"),
+        ),
+        Scenario(
+            "GET /checkins/export",
+            "GET /checkins/export",
+            get("/checkins/export"),
+            max_requests=SLOW_REQUESTS,
+        ),
+        Scenario(
+            "GET /checkins/{checkin_id}", "GET /checkins/{checkin_id}", get(checkin)
+        ),
+        Scenario("GET /stats", "GET /stats", get("/stats")),
+    ]
+
+
+def write_scenarios(client, user: UserContext) -> List[Scenario]:
+    headers = user.headers
+    habit_id = user.habit_id
+
+    async def create_habit(i):
+        return (
+            "POST",
+            "/habits",
+            {
+                "headers": headers,
+                "json": {"name": f"Bench habit {i}", "periodicity": 1},
+            },
+        )
+
+    async def update_habit(i):
+        return (
+            "PUT",
+            f"/habits/{habit_id}",
+            {
+                "headers": headers,
+                "json": {"name": f"Habit renamed {i}", "periodicity": 1 + i % 7},
+            },
+        )
+
+    async def delete_habit(i):
+        response = await client.post(
+            "/habits",
+            json={"name": f"Doomed habit {i}", "periodicity": 1},
+            headers=headers,
+        )
+        return "DELETE", f"/habits/{response.json()['id']}", {"headers": headers}
+
+    def checkin_body(start, i):
+        return {"habit_id": habit_id, "checkin_date": _day(start, i), "completed": True}
+
+    async def create_checkin(i):
+        return (
+            "POST",
+            "/checkins",
+            {
+                "headers": headers,
+                "json": checkin_body(CREATE_START, i),
+            },
+        )
+
+    async def create_batch(i):
+        items = [
+            checkin_body(BATCH_START, i * BATCH_SIZE + k) for k in range(BATCH_SIZE)
+        ]
+        return "POST", "/checkins/batch", {"headers": headers, "json": {"items": items}}
+
+    async def update_checkin(i):
+        return (
+            "PUT",
+            f"/checkins/{user.checkin_id}",
+            {
+                "headers": headers,
+                "json": {
+                    "habit_id": habit_id,
+                    "checkin_date": user.checkin_date,
+                    "completed": i % 2 == 0,
+                },
+            },
+        )
+
+    async def delete_checkin(i):
+        response = await client.post(
+            "/checkins", json=checkin_body(DELETE_START, i), headers=headers
+        )
+        return "DELETE", f"/checkins/{response.json()['id']}", {"headers": headers}
+
+    return [
+        Scenario("POST /habits", "POST /habits", create_habit),
+        Scenario("PUT /habits/{habit_id}", "PUT /habits/{habit_id}", update_habit),
+        Scenario(
+            "DELETE /habits/{habit_id}", "DELETE /habits/{habit_id}", delete_habit
+        ),
+        Scenario("POST /checkins", "POST /checkins", create_checkin),
+        Scenario(
+            f"POST /checkins/batch ({BATCH_SIZE} items)",
+            "POST /checkins/batch",
+            create_batch,
+        ),
+        Scenario(
+            "PUT /checkins/{checkin_id}", "PUT /checkins/{checkin_id}", update_checkin
+        ),
+        Scenario(
+            "DELETE /checkins/{checkin_id}",
+            "DELETE /checkins/{checkin_id}",
+            delete_checkin,
+        ),
+    ]
+
+
+def service_scenarios(client, user: UserContext) -> List[Scenario]:
+    """Служебные маршруты, вход и ошибки: от масштаба не зависят"""
+    from app.rate_limit import limiter
+
+    headers = user.headers
+
+    def call(method, url, **kwargs):
+        async def request(i):
+            return method, url, kwargs
+
+        return request
+
+    async def health(i):
+        # Лимит 50/minute сбрасывается вне замера, чтобы мерить сам /health
+        limiter.reset()
+        return "GET", "/health", {}
+
+    async def exhaust_health_limit():
+        limiter.reset()
+        for _ in range(60):
+            await client.get("/health")
+
+    login = {"username": user.username, "password": user.password}
+    checkin = {
+        "habit_id": user.habit_id,
+        "checkin_date": user.checkin_date,
+        "completed": True,
+    }
+    return [
+        Scenario("GET /health/live", "GET /health/live", call("GET", "/health/live")),
+        Scenario(
+            "GET /health/ready", "GET /health/ready", call("GET", "/health/ready")
+        ),
+        Scenario("GET /health", "GET /health", health),
+        Scenario(
+            "GET /health (429)",
+            "GET /health",
+            call("GET", "/health"),
+            status=429,
+            setup=exhaust_health_limit,
+        ),
+        Scenario(
+            "GET /metrics",
+            "GET /metrics",
+            call(
+                "GET", "/metrics", headers={"Authorization": f"Bearer {METRICS_TOKEN}"}
+            ),
+        ),
+        Scenario(
+            "GET /admin/slow-queries",
+            "GET /admin/slow-queries",
+            call("GET", "/admin/slow-queries", headers={"X-API-Key": ADMIN_KEY}),
+        ),
+        Scenario(
+            "GET /admin/slow-queries (403)",
+            "GET /admin/slow-queries",
+            call("GET", "/admin/slow-queries", headers={"X-API-Key": "wrong"}),
+            status=403,
+        ),
+        Scenario(
+            "POST /login",
+            "POST /login",
+            call("POST", "/login", json=login),
+            max_requests=SLOW_REQUESTS,
+        ),
+        Scenario(
+            "POST /login (wrong password)",
+            "POST /login",
+            call("POST", "/login", json={**login, "password": "WrongPassw0rd!"}),
+            status=401,
+            max_requests=SLOW_REQUESTS,
+        ),
+        Scenario(
+            "POST /login (unknown user)",
+            "POST /login",
+            call("POST", "/login", json={**login, "username": "nobody"}),
+            status=401,
+            max_requests=SLOW_REQUESTS,
+        ),
+        Scenario(
+            "GET /habits (invalid token)",
+            "GET /habits",
+            call("GET", "/habits", headers={"Authorization": "Bearer invalid"}),
+            status=401,
+        ),
+        Scenario(
+            "GET /habits/{habit_id} (404)",
+            "GET /habits/{habit_id}",
+            call("GET", f"/habits/{MISSING_ID}", headers=headers),
+            status=404,
+        ),
+        Scenario(
+            "POST /checkins (404)",
+            "POST /checkins",
+            call(
+                "POST",
+                "/checkins",
+                json={**checkin, "habit_id": MISSING_ID},
+                headers=headers,
+            ),
+            status=404,
+        ),
+        Scenario(
+            "POST /checkins (duplicate)",
+            "POST /checkins",
+            call("POST", "/checkins", json=checkin, headers=headers),
+            status=400,
+        ),
+        Scenario(
+            "POST /habits (422)",
+            "POST /habits",
+            call("POST", "/habits", json={"name": ""}, headers=headers),
+            status=422,
+        ),
+    ]
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(latencies: List[float], elapsed: float, unexpected: int) -> dict:
+    ordered = sorted(latencies)
+    ms = 1000
+    return {
+        "requests": len(ordered),
+        "unexpected_status": unexpected,
+        "mean_ms": round(sum(ordered) / len(ordered) * ms, 4),
+        "p50_ms": round(_percentile(ordered, 50) * ms, 4),
+        "p90_ms": round(_percentile(ordered, 90) * ms, 4),
+        "p95_ms": round(_percentile(ordered, 95) * ms, 4),
+        "p99_ms": round(_percentile(ordered, 99) * ms, 4),
+        "max_ms": round(ordered[-1] * ms, 4),
+        "rps": round(len(ordered) / elapsed, 2),
+    }
+
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int):
+    if scenario.setup is not None:
+        await scenario.setup()
+
+    total = min(requests, scenario.max_requests or requests)
+    latencies: List[float] = []
+    unexpected = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal unexpected
+        for i in counter:
+            method, url, kwargs = await scenario.request(i)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != scenario.status:
+                unexpected += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    # Подготовка запросов входит в elapsed, поэтому rps - нижняя оценка
+    return summarize(latencies, time.perf_counter() - started, unexpected)
+
+
+def uncovered_routes(app, scenarios: List[Scenario]) -> List[str]:
+    from fastapi.routing import APIRoute
+
+    covered = {scenario.route for scenario in scenarios}
+    return sorted(
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+        if f"{method} {route.path}" not in covered
+    )
+
+
+async def run_benchmarks(accounts, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+    results = {}
+    all_scenarios: List[Scenario] = []
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            users = [await prepare_user(client, *account) for account in accounts]
+
+            plan = []
+            for user in users:
+                scenarios = read_scenarios(client, user)
+                scenarios += write_scenarios(client, user)
+                for scenario in scenarios:
+                    scenario.scale = user.scale
+                    plan.append(scenario)
+            plan.extend(service_scenarios(client, users[0]))
+
+            for scenario in plan:
+                result = await run_scenario(client, scenario, requests, concurrency)
+                results[scenario.key] = result
+                all_scenarios.append(scenario)
+                print(
+                    f"{scenario.key:50} p50 {result['p50_ms']:9.3f} ms"
+                    f"  p95 {result['p95_ms']:9.3f} ms  {result['rps']:9.1f} req/s",
+                    file=sys.stderr,
+                )
+                if result["unexpected_status"]:
+                    print(
+                        f"  {result['unexpected_status']} responses with status "
+                        f"other than {scenario.status}",
+                        file=sys.stderr,
+                    )
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scales": [scale for _, _, scale in accounts],
+            "requests": requests,
+            "concurrency": concurrency,
+        },
+        "results": results,
+        "uncovered": uncovered_routes(app, all_scenarios),
+    }
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    min_delta_ms: float = DEFAULT_MIN_DELTA_MS,
+) -> List[dict]:
+    """
+    Сравнивает прогоны по p95 и req/s.
+
+    Регрессия - рост p95 больше чем в (1 + threshold) раз и больше чем на
+    min_delta_ms, либо падение req/s больше чем в (1 + threshold) раз.
+    """
+    rows = []
+    for key, result in current["results"].items():
+        before = baseline["results"].get(key)
+        if before is None:
+            continue
+        p95_ratio = result["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1.0
+        rps_ratio = before["rps"] / result["rps"] if result["rps"] else math.inf
+        regressed = (
+            p95_ratio > 1 + threshold
+            and result["p95_ms"] - before["p95_ms"] > min_delta_ms
+        ) or rps_ratio > 1 + threshold
+        rows.append(
+            {
+                "scenario": key,
+                "baseline_p95_ms": before["p95_ms"],
+                "p95_ms": result["p95_ms"],
+                "p95_ratio": round(p95_ratio, 3),
+                "baseline_rps": before["rps"],
+                "rps": result["rps"],
+                "regressed": regressed,
+            }
+        )
+    return rows
+
+
+def print_comparison(rows: List[dict], file=sys.stdout) -> int:
+    """Печатает сравнение и возвращает код выхода: 1, если есть регрессии"""
+    for row in rows:
+        mark = "REGRESSION" if row["regressed"] else ""
+        print(
+            f"{row['scenario']:50} p95 {row['baseline_p95_ms']:9.3f} -> "
+            f"{row['p95_ms']:9.3f} ms (x{row['p95_ratio']:.2f})  "
+            f"{row['baseline_rps']:9.1f} -> {row['rps']:9.1f} req/s  {mark}",
+            file=file,
+        )
+    regressions = sum(row["regressed"] for row in rows)
+    print(f"{len(rows)} scenarios compared, {regressions} regressions", file=file)
+    return 1 if regressions else 0
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="In-process API benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark suite")
+    run.add_argument(
+        "--scales",
+        default=",".join(map(str, DEFAULT_SCALES)),
+        help="comma-separated checkin counts per seeded user",
+    )
+    run.add_argument("--dataset", help="SQLite file built by benchmarks.seed")
+    run.add_argument("--requests", type=int, default=200)
+    run.add_argument("--concurrency", type=int, default=1)
+    run.add_argument("--output", help="write JSON results here instead of stdout")
+    run.add_argument("--baseline", help="compare with a stored result file")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    run.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS)
+
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    diff.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS)
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        rows = compare(
+            _load(args.baseline), _load(args.current), args.threshold, args.min_delta_ms
+        )
+        return print_comparison(rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = os.path.join(tmp, "bench.db")
+        configure_environment(database_path)
+        if args.dataset:
+            # Записи сценариев идут в копию, исходный набор не меняется
+            shutil.copyfile(args.dataset, database_path)
+            accounts = dataset_accounts()
+        else:
+            accounts = seed([int(scale) for scale in args.scales.split(",")])
+        report = asyncio.run(run_benchmarks(accounts, args.requests, args.concurrency))
+
+    if report["uncovered"]:
+        print(f"Routes without scenarios: {report['uncovered']}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        rows = compare(_load(args.baseline), report, args.threshold, args.min_delta_ms)
+        return print_comparison(rows, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
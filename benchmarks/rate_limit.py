@@ -0,0 +1,108 @@
+"""
+Микробенчмарк стоимости одной проверки лимита для каждого бэкенда.
+
+    python -m benchmarks.rate_limit [--checks 200000] [--processes 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from app.mmap_bucket import MmapBucketStore
+from app.rate_limit import Limiter, get_remote_address
+from app.token_bucket import TokenBucketStore
+
+UNLIMITED = 1_000_000_000
+
+
+def _per_check_us(func, checks: int, repeats: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(checks)
+        best = min(best, time.perf_counter() - started)
+    return best / checks * 1_000_000
+
+
+def bench_same_key(store, checks: int) -> float:
+    def run(n):
+        for _ in range(n):
+            store.acquire("10.0.0.1", UNLIMITED, 60)
+
+    return _per_check_us(run, checks)
+
+
+def bench_ip_spray(store, checks: int) -> float:
+    # Каждая проверка - новый ключ: постоянное вытеснение
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(checks)]
+
+    def run(n):
+        for key in keys[:n]:
+            store.acquire(key, 50, 60)
+
+    return _per_check_us(run, checks)
+
+
+def bench_limiter_check(store, checks: int) -> float:
+    limiter = Limiter(get_remote_address, store)
+    request = SimpleNamespace(client=SimpleNamespace(host="10.0.0.1"))
+
+    def run(n):
+        for _ in range(n):
+            limiter.check("bench", request, "rate", UNLIMITED, 60)
+
+    return _per_check_us(run, checks)
+
+
+def _contended_worker(path: str, checks: int, results) -> None:
+    store = MmapBucketStore(path, slots=10_000)
+    results.put(bench_same_key(store, checks))
+
+
+def bench_mmap_contended(path: str, checks: int, processes: int) -> float:
+    """Несколько процессов бьют в один ключ общей таблицы"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [
+        context.Process(target=_contended_worker, args=(path, checks, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    per_check = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return max(per_check)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rate limiter microbenchmark")
+    parser.add_argument("--checks", type=int, default=200_000)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rate-limit")
+        backends = [
+            ("memory", lambda: TokenBucketStore(max_keys=10_000)),
+            ("mmap", lambda: MmapBucketStore(path, slots=10_000)),
+        ]
+        for backend, make_store in backends:
+            for name, bench in [
+                ("acquire, one key", bench_same_key),
+                ("acquire, unique key per check", bench_ip_spray),
+                ("Limiter.check", bench_limiter_check),
+            ]:
+                per_check = bench(make_store(), args.checks)
+                print(f"{backend:7} {name:32} {per_check:8.3f} us/check")
+
+        per_check = bench_mmap_contended(path, args.checks, args.processes)
+        label = f"one key, {args.processes} processes"
+        print(f"{'mmap':7} {label:32} {per_check:8.3f} us/check")
+
+
+if __name__ == "__main__":
+    main()
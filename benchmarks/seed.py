@@ -0,0 +1,263 @@
+"""
+Генератор синтетических данных для нагрузочных тестов и бенчмарков.
+
+    python -m benchmarks.seed --database-url sqlite:///./data/load.db \\
+        --users 10000 --habits 5 --days 365 [--seed 1] [--reset]
+
+Пользователи load_user_000000 ... с общим паролем SEED_PASSWORD
+(хешируется bcrypt один раз). Строки вставляются Core-инсертами
+пачками в крупных транзакциях, id пользователей и привычек задаются
+заранее, поэтому RETURNING и ORM не нужны. У каждого пользователя свой
+поток случайных чисел от (seed, номер): набор данных воспроизводим и не
+зависит от размера пачек. Счетчики user_stats/habit_stats в конце
+пересчитываются одним rebuild_aggregates.
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import create_engine, event, func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from app.aggregates import rebuild_aggregates
+from app.auth import get_password_hash
+from app.database import Base
+from app.models import Checkin, Habit, User, html_name
+
+SEED_PASSWORD = "LoadTestPassw0rd!"
+USERNAME_FORMAT = "load_user_{:06d}"
+
+# Строк в одном executemany и в одной транзакции
+BATCH_ROWS = 50_000
+TRANSACTION_ROWS = 500_000
+
+# Периодичность в днях и ее вес: большинство привычек ежедневные
+PERIODICITIES = ((1, 0.6), (2, 0.1), (3, 0.1), (7, 0.15), (30, 0.05))
+# Среднее число дней до того, как привычку забрасывают
+MEAN_ABANDON_DAYS = 120
+WEEKEND_FACTOR = 0.8
+COMPLETED_PROBABILITY = 0.85
+
+HABIT_NAMES = (
+    "Morning run",
+    "Read 20 pages",
+    "Meditate",
+    "Drink water",
+    "Practice guitar",
+    "Learn Spanish",
+    "Stretching",
+    "Journal",
+    "No sugar",
+    "Walk 10k steps",
+)
+
+
+def user_rng(seed: int, user_index: int) -> random.Random:
+    """Отдельный воспроизводимый поток случайных чисел на пользователя"""
+    return random.Random(f"{seed}:{user_index}")
+
+
+def generate_user(
+    rng: random.Random, habits: int, weekends: List[bool]
+) -> List[Tuple[str, int, List[Tuple[int, bool]]]]:
+    """
+    Привычки пользователя: (название, периодичность, отметки по номеру дня).
+
+    Пользователь приходит в случайный день окна, заводит в среднем
+    habits привычек в первые недели, отмечает их с личной
+    дисциплинированностью (Beta(4, 2)), реже по выходным, и со временем
+    бросает (экспоненциальный срок жизни привычки).
+    """
+    days = len(weekends)
+    joined = rng.randrange(days)
+    periodicities, weights = zip(*PERIODICITIES)
+    result = []
+
+    for _ in range(rng.randint(1, 2 * habits - 1)):
+        name = rng.choice(HABIT_NAMES)
+        periodicity = rng.choices(periodicities, weights)[0]
+        first = joined + rng.randrange(max(1, min(30, days - joined)))
+        last = min(days, first + int(rng.expovariate(1 / MEAN_ABANDON_DAYS)) + 1)
+        adherence = rng.betavariate(4, 2)
+        weekend_adherence = adherence * WEEKEND_FACTOR
+
+        checkins = [
+            (offset, rng.random() < COMPLETED_PROBABILITY)
+            for offset in range(first, last, periodicity)
+            if rng.random() < (weekend_adherence if weekends[offset] else adherence)
+        ]
+        result.append((name, periodicity, checkins))
+    return result
+
+
+def _bulk_insert(connection: Connection, model, columns: tuple, rows: list) -> None:
+    """
+    executemany кортежей напрямую в драйвер, минуя обработку параметров
+    SQLAlchemy по строкам; SQL по-прежнему строит Core для диалекта
+    """
+    stmt = insert(model).compile(dialect=connection.dialect, column_keys=columns)
+    if connection.dialect.positional:
+        order = [columns.index(key) for key in stmt.positiontup]
+        if order != list(range(len(columns))):
+            rows = [tuple(row[i] for i in order) for row in rows]
+        connection.exec_driver_sql(str(stmt), rows)
+    else:
+        connection.exec_driver_sql(str(stmt), [dict(zip(columns, row)) for row in rows])
+
+
+def _fast_sqlite_load(engine: Engine) -> None:
+    """Ослабленная надежность на время загрузки: файл создается заново"""
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA cache_size=-200000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        # Как и в приложении: ссылки на users/habits проверяются при вставке
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def _prepare_schema(connection: Connection, reset: bool) -> None:
+    if reset:
+        Base.metadata.drop_all(connection)
+    Base.metadata.create_all(connection)
+    if connection.scalar(select(func.count()).select_from(User)):
+        raise SystemExit("Database already has users; pass --reset to rebuild it")
+
+
+def seed_database(
+    database_url: str,
+    users: int,
+    habits: int = 5,
+    days: int = 365,
+    seed: int = 1,
+    end: date = date(2024, 12, 31),
+    password: str = SEED_PASSWORD,
+    reset: bool = False,
+) -> dict:
+    """Заполняет БД и возвращает сводку: число строк и время"""
+    started = time.perf_counter()
+    engine = create_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        _fast_sqlite_load(engine)
+
+    # Один хеш на всех пользователей: bcrypt дороже всей остальной загрузки
+    password_hash = get_password_hash(password)
+    counts = {"users": 0, "habits": 0, "checkins": 0}
+
+    calendar = [end - timedelta(days=days - 1 - offset) for offset in range(days)]
+    weekends = [day.weekday() >= 5 for day in calendar]
+    # Параметры идут мимо типов SQLAlchemy: SQLite хранит Date как ISO-строку
+    if engine.dialect.name == "sqlite":
+        calendar = [day.isoformat() for day in calendar]
+
+    tables = {
+        "users": (User, ("id", "username", "password")),
+        "habits": (Habit, ("id", "name", "name_html", "periodicity", "user_id")),
+        "checkins": (Checkin, ("habit_id", "checkin_date", "completed")),
+    }
+    pending = {name: [] for name in tables}
+
+    def generate() -> Iterator[str]:
+        """Наполняет pending и сообщает, какая таблица пополнилась"""
+        habit_id = 0
+        for index in range(users):
+            user_id = index + 1
+            pending["users"].append(
+                (user_id, USERNAME_FORMAT.format(index), password_hash)
+            )
+            yield "users"
+            rng = user_rng(seed, index)
+            for name, periodicity, checkins in generate_user(rng, habits, weekends):
+                habit_id += 1
+                pending["habits"].append(
+                    (habit_id, name, html_name(name), periodicity, user_id)
+                )
+                pending["checkins"].extend(
+                    (habit_id, calendar[offset], completed)
+                    for offset, completed in checkins
+                )
+            yield "checkins"
+
+    def flush(connection: Connection) -> int:
+        # Родительские строки раньше дочерних: внешние ключи включены
+        flushed = 0
+        for name, (model, columns) in tables.items():
+            if pending[name]:
+                _bulk_insert(connection, model, columns, pending[name])
+                counts[name] += len(pending[name])
+                flushed += len(pending[name])
+                pending[name] = []
+        return flushed
+
+    with engine.connect() as connection:
+        with connection.begin():
+            _prepare_schema(connection, reset)
+
+        # Индексы строятся один раз после загрузки: сортировка всей таблицы
+        # дешевле, чем поддерживать B-дерево по checkin_date на каждой вставке
+        indexes = list(Checkin.__table__.indexes)
+        with connection.begin():
+            for index in indexes:
+                index.drop(connection)
+
+        transaction = connection.begin()
+        in_transaction = 0
+        for table in generate():
+            if len(pending[table]) >= BATCH_ROWS:
+                in_transaction += flush(connection)
+                if in_transaction >= TRANSACTION_ROWS:
+                    transaction.commit()
+                    transaction = connection.begin()
+                    in_transaction = 0
+        flush(connection)
+        for index in indexes:
+            index.create(connection)
+        rebuild_aggregates(connection)
+        transaction.commit()
+
+    engine.dispose()
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Synthetic load-test data seeder")
+    parser.add_argument("--database-url", default="sqlite:///./data/load.db")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--habits", type=int, default=5, help="mean habits per user")
+    parser.add_argument("--days", type=int, default=365, help="history length")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2024, 12, 31))
+    parser.add_argument("--reset", action="store_true", help="drop existing tables")
+    args = parser.parse_args()
+
+    summary = seed_database(
+        args.database_url,
+        users=args.users,
+        habits=args.habits,
+        days=args.days,
+        seed=args.seed,
+        end=args.end,
+        reset=args.reset,
+    )
+    rate = summary["checkins"] / summary["seconds"] if summary["seconds"] else math.inf
+    print(
+        f"{summary['users']} users, {summary['habits']} habits, "
+        f"{summary['checkins']} checkins in {summary['seconds']} s "
+        f"({rate:,.0f} checkins/s); password: {SEED_PASSWORD}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Стоимость сериализации списков в микросекундах на строку.
+
+    python -m benchmarks.serialization [--rows 200] [--repeats 200]
+
+Три варианта: ORM-объекты с проверкой по response_model и stdlib json
+(как было), кортежи строк с той же проверкой (обычный режим сейчас) и
+кортежи строк с orjson без повторной проверки (FAST_SERIALIZATION=true).
+Замер включает выборку из SQLite в памяти, поэтому виден и выигрыш от
+отказа от ORM-объектов.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import Checkin, Habit, User
+from app.pagination import build_page
+from app.schemas import CheckinPage, HabitPage
+from app.serialization import CHECKIN_COLUMNS, HABIT_COLUMNS, rows_as_dicts
+
+
+def setup_database(rows: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User).values(id=1, username="bench", password="x"))
+        connection.execute(
+            insert(Habit),
+            [
+                {"id": i + 1, "name": f"Habit {i}", "periodicity": 1, "user_id": 1}
+                for i in range(rows)
+            ],
+        )
+        start = date(2024, 1, 1)
+        connection.execute(
+            insert(Checkin),
+            [
+                {
+                    "habit_id": 1,
+                    "checkin_date": start + timedelta(days=i),
+                    "completed": i % 3 != 0,
+                }
+                for i in range(rows)
+            ],
+        )
+    return engine
+
+
+def _per_row_us(func, rows: int, repeats: int) -> float:
+    func()
+    best = float("inf")
+    # Лучший из пяти прогонов по repeats вызовов: меньше шума планировщика
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            func()
+        best = min(best, (time.perf_counter() - started) / repeats)
+    return best / rows * 1_000_000
+
+
+def orm_validated(engine, model, page_model, rows: int):
+    """Как было: ORM-объекты -> response_model -> stdlib json"""
+    field = create_response_field(name="response", type_=page_model)
+    loop = asyncio.new_event_loop()
+
+    def run():
+        with Session(engine) as session:
+            items = session.scalars(select(model).limit(rows + 1)).all()
+            page = build_page(items, rows, lambda item: (item.id,))
+            content = loop.run_until_complete(
+                serialize_response(field=field, response_content=page)
+            )
+            return JSONResponse(content).body
+
+    return run
+
+
+def rows_validated(engine, columns, page_model, rows: int):
+    """Обычный режим: кортежи строк -> словари -> response_model -> stdlib json"""
+    field = create_response_field(name="response", type_=page_model)
+    loop = asyncio.new_event_loop()
+
+    def run():
+        with engine.connect() as connection:
+            result = connection.execute(select(*columns).limit(rows + 1))
+            page = build_page(rows_as_dicts(result), rows, lambda item: (item["id"],))
+            content = loop.run_until_complete(
+                serialize_response(field=field, response_content=page)
+            )
+            return JSONResponse(content).body
+
+    return run
+
+
+def rows_trusted(engine, columns, rows: int):
+    """FAST_SERIALIZATION: кортежи строк -> словари -> orjson"""
+
+    def run():
+        with engine.connect() as connection:
+            result = connection.execute(select(*columns).limit(rows + 1))
+            page = build_page(rows_as_dicts(result), rows, lambda item: (item["id"],))
+            return ORJSONResponse(page).body
+
+    return run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="List serialization benchmark")
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = setup_database(args.rows)
+    cases = [
+        ("habits", Habit, HabitPage, HABIT_COLUMNS),
+        ("checkins", Checkin, CheckinPage, CHECKIN_COLUMNS),
+    ]
+    for name, model, page_model, columns in cases:
+        variants = [
+            (
+                "ORM + response_model + json",
+                orm_validated(engine, model, page_model, args.rows),
+            ),
+            (
+                "rows + response_model + json",
+                rows_validated(engine, columns, page_model, args.rows),
+            ),
+            ("rows + orjson", rows_trusted(engine, columns, args.rows)),
+        ]
+        baseline = None
+        for label, func in variants:
+            per_row = _per_row_us(func, args.rows, args.repeats)
+            baseline = baseline or per_row
+            print(
+                f"{name:9} {label:30} {per_row:7.2f} us/row  x{baseline / per_row:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
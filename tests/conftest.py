@@ -1,22 +1,28 @@
 # tests/conftest.py
 import sys
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 
 import pytest
 from fastapi.testclient import TestClient
 from jose import jwt
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 ROOT = Path(__file__).resolve().parents[1]  # корень репозитория
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from app.auth import ALGORITHM, SECRET_KEY, get_password_hash  # noqa: E402
-from app.database import get_db  # noqa: E402
+from app.auth_cache import principal_cache  # noqa: E402
+from app.database import apply_sqlite_profile, get_async_db, open_session  # noqa: E402
 from app.main import app  # noqa: E402
 from app.models import Base, Checkin, Habit, User  # noqa: E402
+from app.rate_limit import limiter  # noqa: E402
+from app.versioning import data_versions  # noqa: E402
 
 # Тестовая база данных в памяти
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -24,19 +30,33 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+apply_sqlite_profile(engine)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient запускает новый event loop на каждый запрос,
+# поэтому асинхронные соединения не переиспользуются между запросами
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+apply_sqlite_profile(async_engine.sync_engine)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+# Сессии эндпоинтов при DB_SESSION_MODE=sync, настроены как SessionLocal
+TestingEndpointSessionLocal = sessionmaker(
+    bind=engine, autoflush=False, expire_on_commit=False
+)
 
-def override_get_db():
-    """Переопределение зависимости базы данных для тестов"""
-    try:
-        db = TestingSessionLocal()
+
+async def override_get_async_db():
+    """Переопределение зависимости базы данных для тестов (режим DB_SESSION_MODE)"""
+    async with open_session(
+        TestingAsyncSessionLocal, TestingEndpointSessionLocal, async_engine
+    ) as db:
         yield db
-    finally:
-        db.close()
 
 
-app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 
 @pytest.fixture(scope="function")
@@ -44,6 +64,9 @@ def test_db():
     """Создание и очистка тестовой базы данных для каждого теста"""
     # Создаем таблицы
     Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    data_versions.clear()
+    limiter.reset()
 
     db = TestingSessionLocal()
 
@@ -121,6 +144,42 @@ def expired_token_headers():
     return {"Authorization": f"Bearer {expired_token}"}
 
 
+@pytest.fixture
+def query_budget():
+    """
+    Бюджет SQL-запросов для блока кода, обычно одного HTTP-запроса:
+
+        with query_budget(2):
+            client.get(...)
+
+    Тест падает со списком выполненных запросов, если их больше бюджета.
+    Считаются запросы обоих тестовых движков, PRAGMA при подключении - нет.
+    """
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    targets = (engine, async_engine.sync_engine)
+    for target in targets:
+        event.listen(target, "before_cursor_execute", count_statement)
+
+    @contextmanager
+    def budget(max_statements: int):
+        start = len(statements)
+        yield
+        executed = statements[start:]
+        listing = "\n".join(f"  {statement}" for statement in executed)
+        assert (
+            len(executed) <= max_statements
+        ), f"{len(executed)} SQL statements, budget {max_statements}:\n{listing}"
+
+    yield budget
+
+    for target in targets:
+        event.remove(target, "before_cursor_execute", count_statement)
+
+
 @pytest.fixture(autouse=True)
 def cleanup_database(test_db):
     """Очистка базы данных перед каждым тестом"""
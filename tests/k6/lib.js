@@ -0,0 +1,235 @@
+import http from "k6/http";
+import { check } from "k6";
+
+// --- Общие настройки сценариев ---
+export const BASE_URL = __ENV.BASE_URL || "http://localhost:8000";
+// Пользователи из python -m benchmarks.seed: load_user_000000 ... с общим паролем
+export const USER_COUNT = parseInt(__ENV.USER_COUNT || "200", 10);
+export const USER_PREFIX = __ENV.USER_PREFIX || "load_user_";
+export const PASSWORD = __ENV.PASSWORD || "LoadTestPassw0rd!";
+
+const JSON_HEADERS = { "Content-Type": "application/json" };
+// Даты новых отметок не пересекаются с историей, которую создает seed
+const CHECKIN_DAYS = 3650;
+const CHECKIN_START = Date.UTC(2030, 0, 1);
+
+// Маршруты и требования: чтения - NFR-01 (p95 ≤ 200 мс), записи - NFR-05 (p95 ≤ 100 мс).
+// Вход упирается в хеширование пароля (NFR-08) и порогом времени не ограничен
+export const ROUTES = {
+  login: { name: "POST /login", nfr: "NFR-08" },
+  listHabits: { name: "GET /habits", nfr: "NFR-01" },
+  getHabit: { name: "GET /habits/{habit_id}", nfr: "NFR-01" },
+  habitDetailed: { name: "GET /habits/{habit_id}/detailed", nfr: "NFR-01" },
+  habitStats: { name: "GET /habits/{habit_id}/stats", nfr: "NFR-01" },
+  listCheckins: { name: "GET /checkins", nfr: "NFR-01" },
+  stats: { name: "GET /stats", nfr: "NFR-01" },
+  createHabit: { name: "POST /habits", nfr: "NFR-05" },
+  updateHabit: { name: "PUT /habits/{habit_id}", nfr: "NFR-05" },
+  deleteHabit: { name: "DELETE /habits/{habit_id}", nfr: "NFR-05" },
+  createCheckin: { name: "POST /checkins", nfr: "NFR-05" },
+  updateCheckin: { name: "PUT /checkins/{checkin_id}", nfr: "NFR-05" },
+};
+
+// Повторная отметка на ту же дату (DUPLICATE_CHECKIN) - штатный ответ
+const CREATED_OR_DUPLICATE = http.expectedStatuses(200, 400);
+// 503 при входе - сброс нагрузки пулом хеширования паролей, клиент повторит
+const LOGGED_IN_OR_SHED = http.expectedStatuses(200, 503);
+
+function params(route, session, extra) {
+  return Object.assign(
+    {
+      headers: session
+        ? Object.assign({ Authorization: `Bearer ${session.token}` }, JSON_HEADERS)
+        : JSON_HEADERS,
+      tags: { name: route.name, nfr: route.nfr },
+    },
+    extra || {}
+  );
+}
+
+function pick(items) {
+  return items[Math.floor(Math.random() * items.length)];
+}
+
+function randomCheckinDate() {
+  const day = Math.floor(Math.random() * CHECKIN_DAYS);
+  return new Date(CHECKIN_START + day * 86400000).toISOString().slice(0, 10);
+}
+
+// --- Сессия VU ---
+// Каждый VU работает от своего пользователя, поэтому фильтры по владельцу
+// и кэши на пользователя нагружаются так же, как в проде
+export function usernameFor(vu) {
+  return USER_PREFIX + String((vu - 1) % USER_COUNT).padStart(6, "0");
+}
+
+export function login(username) {
+  const res = http.post(
+    `${BASE_URL}/login`,
+    JSON.stringify({ username: username, password: PASSWORD }),
+    params(ROUTES.login, null, { responseCallback: LOGGED_IN_OR_SHED })
+  );
+  check(res, { "login: 200 or 503": (r) => r.status === 200 || r.status === 503 });
+  if (res.status !== 200) {
+    return null;
+  }
+
+  const session = { username: username, token: res.json("access_token"), habits: [], checkins: [] };
+  refreshHabits(session);
+  return session;
+}
+
+export function refreshHabits(session) {
+  const res = http.get(`${BASE_URL}/habits?limit=100`, params(ROUTES.listHabits, session));
+  check(res, { "GET /habits: 200": (r) => r.status === 200 });
+  if (res.status === 200) {
+    session.habits = res.json("items").map((habit) => habit.id);
+  }
+}
+
+// --- Действия пользователя ---
+export function viewHabit(session) {
+  if (session.habits.length === 0) {
+    return refreshHabits(session);
+  }
+  const id = pick(session.habits);
+  const res = http.get(`${BASE_URL}/habits/${id}`, params(ROUTES.getHabit, session));
+  check(res, { "GET /habits/{id}: 200": (r) => r.status === 200 });
+}
+
+export function viewHabitDetailed(session) {
+  if (session.habits.length === 0) {
+    return refreshHabits(session);
+  }
+  const id = pick(session.habits);
+  const res = http.get(`${BASE_URL}/habits/${id}/detailed`, params(ROUTES.habitDetailed, session));
+  check(res, { "GET /habits/{id}/detailed: 200": (r) => r.status === 200 });
+}
+
+export function viewHabitStats(session) {
+  if (session.habits.length === 0) {
+    return refreshHabits(session);
+  }
+  const id = pick(session.habits);
+  const res = http.get(`${BASE_URL}/habits/${id}/stats`, params(ROUTES.habitStats, session));
+  check(res, { "GET /habits/{id}/stats: 200": (r) => r.status === 200 });
+}
+
+export function listCheckins(session) {
+  const res = http.get(`${BASE_URL}/checkins?limit=50`, params(ROUTES.listCheckins, session));
+  check(res, { "GET /checkins: 200": (r) => r.status === 200 });
+}
+
+export function viewStats(session) {
+  const res = http.get(`${BASE_URL}/stats`, params(ROUTES.stats, session));
+  check(res, { "GET /stats: 200": (r) => r.status === 200 });
+}
+
+export function createCheckin(session) {
+  if (session.habits.length === 0) {
+    return refreshHabits(session);
+  }
+  const body = { habit_id: pick(session.habits), checkin_date: randomCheckinDate(), completed: Math.random() < 0.85 };
+  const res = http.post(
+    `${BASE_URL}/checkins`,
+    JSON.stringify(body),
+    params(ROUTES.createCheckin, session, { responseCallback: CREATED_OR_DUPLICATE })
+  );
+  check(res, { "POST /checkins: 200 or duplicate": (r) => r.status === 200 || r.status === 400 });
+  if (res.status === 200) {
+    // Последние созданные отметки - кандидаты на исправление
+    session.checkins.push(Object.assign({ id: res.json("id") }, body));
+    if (session.checkins.length > 20) {
+      session.checkins.shift();
+    }
+  }
+}
+
+export function updateCheckin(session) {
+  if (session.checkins.length === 0) {
+    return createCheckin(session);
+  }
+  const checkin = pick(session.checkins);
+  checkin.completed = !checkin.completed;
+  const res = http.put(
+    `${BASE_URL}/checkins/${checkin.id}`,
+    JSON.stringify({ habit_id: checkin.habit_id, checkin_date: checkin.checkin_date, completed: checkin.completed }),
+    params(ROUTES.updateCheckin, session)
+  );
+  check(res, { "PUT /checkins/{id}: 200": (r) => r.status === 200 });
+}
+
+// Повторный вход: токены истекают, клиенты переустанавливаются
+export function relogin(session) {
+  const fresh = login(session.username);
+  if (fresh) {
+    session.token = fresh.token;
+    session.habits = fresh.habits;
+  }
+}
+
+// Полный цикл привычки: число привычек пользователя не растет
+export function habitLifecycle(session) {
+  let res = http.post(
+    `${BASE_URL}/habits`,
+    JSON.stringify({ name: "k6 habit", periodicity: 1 }),
+    params(ROUTES.createHabit, session)
+  );
+  if (!check(res, { "POST /habits: 200": (r) => r.status === 200 })) {
+    return;
+  }
+  const id = res.json("id");
+
+  res = http.put(
+    `${BASE_URL}/habits/${id}`,
+    JSON.stringify({ name: "k6 habit renamed", periodicity: 7 }),
+    params(ROUTES.updateHabit, session)
+  );
+  check(res, { "PUT /habits/{id}: 200": (r) => r.status === 200 });
+
+  res = http.del(`${BASE_URL}/habits/${id}`, null, params(ROUTES.deleteHabit, session));
+  check(res, { "DELETE /habits/{id}: 200": (r) => r.status === 200 });
+}
+
+// Доли действий в смеси: чтений намного больше, чем записей
+export const MIX = [
+  { weight: 25, action: refreshHabits },
+  { weight: 15, action: viewHabit },
+  { weight: 15, action: viewHabitDetailed },
+  { weight: 10, action: viewHabitStats },
+  { weight: 10, action: listCheckins },
+  { weight: 10, action: viewStats },
+  { weight: 10, action: createCheckin },
+  { weight: 4, action: updateCheckin },
+  { weight: 1, action: habitLifecycle },
+  { weight: 1, action: relogin },
+];
+
+export function pickAction(mix) {
+  const total = mix.reduce((sum, item) => sum + item.weight, 0);
+  let point = Math.random() * total;
+  for (const item of mix) {
+    point -= item.weight;
+    if (point < 0) {
+      return item.action;
+    }
+  }
+  return mix[mix.length - 1].action;
+}
+
+// Пороги по каждому маршруту с тегом требования; factor ослабляет их для стресс-профилей
+export function routeThresholds(factor) {
+  const limits = { "NFR-01": 200, "NFR-05": 100 };
+  const thresholds = {
+    http_req_failed: ["rate<0.01"],
+    "http_req_duration{nfr:NFR-01}": [`p(95)<${limits["NFR-01"] * factor}`],
+    "http_req_duration{nfr:NFR-05}": [`p(95)<${limits["NFR-05"] * factor}`],
+  };
+  for (const route of Object.values(ROUTES)) {
+    if (!(route.nfr in limits)) {
+      continue;
+    }
+    thresholds[`http_req_duration{name:${route.name}}`] = [`p(95)<${limits[route.nfr] * factor}`];
+  }
+  return thresholds;
+}
@@ -0,0 +1,117 @@
+import { sleep } from "k6";
+import exec from "k6/execution";
+import { login, MIX, pickAction, routeThresholds, usernameFor } from "./lib.js";
+
+// Смешанная нагрузка: вход, CRUD привычек, отметки, статистика и детальные
+// представления от разных пользователей. Данные готовит
+//   python -m benchmarks.seed --users 200 --reset
+// Профиль выбирается переменной PROFILE:
+//   k6 run -e PROFILE=ramp tests/k6/mixed_workload.js
+
+const PROFILE = __ENV.PROFILE || "ramp";
+const RATE = parseInt(__ENV.RATE || "50", 10);
+const MAX_VUS = parseInt(__ENV.MAX_VUS || "200", 10);
+
+const PROFILES = {
+  // Проверка сценариев перед длинным прогоном
+  smoke: {
+    executor: "constant-vus",
+    vus: 2,
+    duration: "30s",
+  },
+  // CI: NFR-01 и NFR-05 заданы при 50 RPS
+  ci: {
+    executor: "constant-arrival-rate",
+    rate: RATE,
+    timeUnit: "1s",
+    duration: "1m",
+    preAllocatedVUs: 50,
+    maxVUs: MAX_VUS,
+  },
+  // Открытая модель: поток запросов не зависит от времени ответа,
+  // поэтому деградация видна как рост задержек, а не падение RPS
+  ramp: {
+    executor: "ramping-arrival-rate",
+    startRate: 5,
+    timeUnit: "1s",
+    preAllocatedVUs: 50,
+    maxVUs: MAX_VUS,
+    stages: [
+      { target: RATE, duration: "1m" },
+      { target: RATE, duration: "5m" },
+      { target: 0, duration: "30s" },
+    ],
+  },
+  // Негативный сценарий NFR_BDD: 100 RPS в течение 10 минут
+  stress: {
+    executor: "ramping-arrival-rate",
+    startRate: RATE,
+    timeUnit: "1s",
+    preAllocatedVUs: 100,
+    maxVUs: MAX_VUS * 2,
+    stages: [
+      { target: RATE * 2, duration: "1m" },
+      { target: RATE * 2, duration: "10m" },
+    ],
+  },
+  // Всплеск в 6 раз выше нормы и возврат к ней
+  spike: {
+    executor: "ramping-arrival-rate",
+    startRate: 10,
+    timeUnit: "1s",
+    preAllocatedVUs: 100,
+    maxVUs: MAX_VUS * 2,
+    stages: [
+      { target: RATE / 5, duration: "1m" },
+      { target: RATE * 6, duration: "10s" },
+      { target: RATE * 6, duration: "1m" },
+      { target: RATE / 5, duration: "10s" },
+      { target: RATE / 5, duration: "2m" },
+    ],
+  },
+  // Долгий прогон на номинальной нагрузке: утечки, рост WAL, кэши
+  soak: {
+    executor: "constant-arrival-rate",
+    rate: RATE,
+    timeUnit: "1s",
+    duration: __ENV.SOAK_DURATION || "1h",
+    preAllocatedVUs: 50,
+    maxVUs: MAX_VUS,
+  },
+};
+
+if (!(PROFILE in PROFILES)) {
+  throw new Error(`Unknown PROFILE "${PROFILE}", expected one of: ${Object.keys(PROFILES).join(", ")}`);
+}
+
+// Под перегрузкой действуют ослабленные пороги негативного сценария
+// из NFR_BDD: p95 не больше удвоенного номинального
+const DEGRADED = { stress: 2, spike: 2 };
+
+export const options = {
+  scenarios: { [PROFILE]: PROFILES[PROFILE] },
+  thresholds: routeThresholds(DEGRADED[PROFILE] || 1),
+  summaryTrendStats: ["avg", "med", "p(90)", "p(95)", "p(99)", "max"],
+};
+
+// Без заполненной базы прогон бессмыслен: останавливаемся сразу
+export function setup() {
+  if (login(usernameFor(1)) === null) {
+    exec.test.abort("Login failed: seed the database with python -m benchmarks.seed");
+  }
+}
+
+// Сессия живет в VU между итерациями; вход - при первой итерации
+let session = null;
+
+export default function () {
+  if (session === null) {
+    session = login(usernameFor(__VU));
+    if (session === null) {
+      // Отказ или сброс нагрузки при входе: повтор со следующей итерации
+      sleep(1);
+      return;
+    }
+  }
+  pickAction(MIX)(session);
+}
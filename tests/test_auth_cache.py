@@ -0,0 +1,60 @@
+import time
+
+from app.auth_cache import Principal, PrincipalCache, principal_cache
+
+
+class TestPrincipalCache:
+    """Тесты кэша аутентифицированных пользователей"""
+
+    def test_lru_eviction(self):
+        """Тест вытеснения самых старых записей"""
+        cache = PrincipalCache(max_entries=2, ttl_seconds=60)
+        far_future = time.time() + 3600
+        for i in range(3):
+            cache.put(f"k{i}", Principal(id=i, username=f"u{i}"), far_future)
+
+        assert cache.get("k0") is None
+        assert cache.get("k2") == Principal(id=2, username="u2")
+        assert cache.stats()["entries"] == 2
+
+    def test_entry_never_outlives_token(self):
+        """Тест: запись не переживает срок действия токена"""
+        cache = PrincipalCache(max_entries=10, ttl_seconds=60)
+        cache.put("expired", Principal(id=1, username="u"), time.time() - 1)
+        assert cache.get("expired") is None
+
+    def test_invalidate_user(self):
+        """Тест инвалидации всех токенов пользователя"""
+        cache = PrincipalCache(max_entries=10, ttl_seconds=60)
+        far_future = time.time() + 3600
+        cache.put("a", Principal(id=1, username="u1"), far_future)
+        cache.put("b", Principal(id=1, username="u1"), far_future)
+        cache.put("c", Principal(id=2, username="u2"), far_future)
+
+        cache.invalidate_user(1)
+
+        assert cache.get("a") is None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+    def test_repeat_requests_hit_cache(self, client, auth_headers):
+        """Тест: повторные запросы не проверяют токен заново"""
+        assert client.get("/users/me", headers=auth_headers).status_code == 200
+        misses = principal_cache.misses
+
+        for _ in range(3):
+            assert client.get("/habits", headers=auth_headers).status_code == 200
+
+        assert principal_cache.misses == misses
+        assert principal_cache.hits >= 3
+
+    def test_deleted_user_token_rejected(
+        self, client, auth_headers, test_db, test_user
+    ):
+        """Тест: удаление пользователя отзывает закэшированный токен"""
+        assert client.get("/users/me", headers=auth_headers).status_code == 200
+
+        test_db.delete(test_user)
+        test_db.commit()
+
+        assert client.get("/users/me", headers=auth_headers).status_code == 401
@@ -0,0 +1,72 @@
+from sqlalchemy import create_engine, func, select
+
+from app.aggregates import find_drift
+from app.models import Checkin, Habit, User
+from benchmarks.api import compare, summarize
+from benchmarks.seed import generate_user, seed_database, user_rng
+
+
+def _report(p95_ms, rps):
+    return {"results": {"GET /habits [10]": {"p95_ms": p95_ms, "rps": rps}}}
+
+
+class TestBenchmarkCompare:
+    """Тесты сводки и сравнения результатов бенчмарка"""
+
+    def test_summarize(self):
+        """Тест перцентилей и пропускной способности по задержкам"""
+        latencies = [i / 1000 for i in range(1, 101)]
+
+        result = summarize(latencies, elapsed=2.0, unexpected=0)
+
+        assert result["requests"] == 100
+        assert result["p50_ms"] == 50
+        assert result["p95_ms"] == 95
+        assert result["max_ms"] == 100
+        assert result["rps"] == 50
+
+    def test_regression_detected(self):
+        """Тест: рост p95 выше порога и шума - регрессия"""
+        rows = compare(_report(10.0, 100), _report(13.0, 100), threshold=0.2)
+
+        assert rows[0]["regressed"]
+
+    def test_noise_ignored(self):
+        """Тест: рост в пределах порога или меньше min_delta_ms - не регрессия"""
+        assert not compare(_report(10.0, 100), _report(11.0, 100))[0]["regressed"]
+        assert not compare(_report(0.1, 100), _report(0.3, 100))[0]["regressed"]
+
+    def test_throughput_drop_detected(self):
+        """Тест: падение req/s выше порога - регрессия"""
+        rows = compare(_report(10.0, 100), _report(10.0, 50))
+
+        assert rows[0]["regressed"]
+
+
+class TestSeeder:
+    """Тесты генератора синтетических данных"""
+
+    def test_user_stream_is_deterministic(self):
+        """Тест: одинаковые seed и номер дают одинаковые данные"""
+        weekends = [day % 7 >= 5 for day in range(365)]
+
+        first = generate_user(user_rng(1, 42), 5, weekends)
+        second = generate_user(user_rng(1, 42), 5, weekends)
+
+        assert first == second
+        assert first != generate_user(user_rng(2, 42), 5, weekends)
+
+    def test_seed_database(self, tmp_path):
+        """Тест: загрузка заполняет таблицы и согласованные агрегаты"""
+        url = f"sqlite:///{tmp_path / 'load.db'}"
+
+        summary = seed_database(url, users=20, habits=3, days=90, seed=7)
+
+        engine = create_engine(url)
+        with engine.connect() as connection:
+            assert connection.scalar(select(func.count(User.id))) == 20
+            assert connection.scalar(select(func.count(Habit.id))) == summary["habits"]
+            checkins = connection.scalar(select(func.count(Checkin.id)))
+            assert checkins == summary["checkins"] > 0
+            assert find_drift(connection) == []
+        engine.dispose()
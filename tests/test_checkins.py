@@ -1,3 +1,14 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
+
+from app.database import explain
+from app.models import create_missing_indexes, dedupe_checkins
+from app.schemas import MAX_CHECKIN_BATCH_SIZE
+
+
 class TestCheckinsCRUD:
     """Тесты CRUD операций для отметок"""
 
@@ -37,7 +48,92 @@ class TestCheckinsCRUD:
         response = client.get("/checkins", headers=auth_headers)
         assert response.status_code == 200
         checkins = response.json()
-        assert len(checkins) == 1
+        assert isinstance(checkins, list)
+        assert [c["id"] for c in checkins] == [sample_checkin["id"]]
+
+    def test_get_checkins_pagination(self, client, sample_habit, auth_headers):
+        """Тест курсорной пагинации отметок в порядке (привычка, дата)"""
+        other_habit = client.post(
+            "/habits", json={"name": "Другая", "periodicity": 1}, headers=auth_headers
+        ).json()
+        for day in (3, 1, 2):
+            for habit in (sample_habit, other_habit):
+                client.post(
+                    "/checkins",
+                    json={
+                        "habit_id": habit["id"],
+                        "checkin_date": f"2024-10-0{day}",
+                        "completed": True,
+                    },
+                    headers=auth_headers,
+                )
+
+        seen = []
+        params = {"limit": 4}
+        while True:
+            response = client.get("/checkins", params=params, headers=auth_headers)
+            body = response.json()
+            seen.extend((c["habit_id"], c["checkin_date"]) for c in body["items"])
+            if body["next_cursor"] is None:
+                break
+            params = {"limit": 4, "after": body["next_cursor"]}
+
+        assert len(seen) == 6
+        assert seen == sorted(seen)
+
+        # Без limit и after - весь список в том же порядке, без обертки
+        response = client.get("/checkins", headers=auth_headers)
+        assert [(c["habit_id"], c["checkin_date"]) for c in response.json()] == seen
+
+        response = client.get(
+            "/checkins",
+            params={"habit_id": other_habit["id"], "limit": 2},
+            headers=auth_headers,
+        )
+        body = response.json()
+        assert [c["checkin_date"] for c in body["items"]] == [
+            "2024-10-01",
+            "2024-10-02",
+        ]
+        assert all(c["habit_id"] == other_habit["id"] for c in body["items"])
+        assert body["next_cursor"] is not None
+
+    def test_get_checkins_order_served_by_indexes(
+        self, client, sample_habit, auth_headers, test_db
+    ):
+        """Тест: порядок страниц отметок дают индексы, без сортировки"""
+        for day in (1, 2):
+            client.post(
+                "/checkins",
+                json={
+                    "habit_id": sample_habit["id"],
+                    "checkin_date": f"2024-10-0{day}",
+                    "completed": True,
+                },
+                headers=auth_headers,
+            )
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("SELECT") and "FROM checkins JOIN" in statement:
+                statements.append((statement, parameters))
+
+        event.listen(Engine, "before_cursor_execute", capture)
+        try:
+            first = client.get("/checkins", params={"limit": 1}, headers=auth_headers)
+            client.get(
+                "/checkins",
+                params={"after": first.json()["next_cursor"]},
+                headers=auth_headers,
+            )
+        finally:
+            event.remove(Engine, "before_cursor_execute", capture)
+
+        assert len(statements) == 2
+        for statement, parameters in statements:
+            plan = explain(test_db.connection(), statement, parameters)
+            assert not any("TEMP B-TREE" in step for step in plan), plan
 
     def test_get_checkin_by_id(self, client, sample_checkin, auth_headers):
         """Тест получения отметки по ID"""
@@ -136,3 +232,177 @@ class TestCheckinsCRUD:
 
         response = client.delete(f"/checkins/{sample_checkin['id']}")
         assert response.status_code == 403
+
+    def test_update_checkin_duplicate(self, client, sample_checkin, auth_headers):
+        """Тест переноса отметки на занятую дату"""
+        checkin_data = {
+            "habit_id": sample_checkin["habit_id"],
+            "checkin_date": "2024-10-20",
+            "completed": False,
+        }
+        other = client.post("/checkins", json=checkin_data, headers=auth_headers)
+        assert other.status_code == 200
+
+        response = client.put(
+            f"/checkins/{other.json()['id']}",
+            json={**checkin_data, "checkin_date": sample_checkin["checkin_date"]},
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+        assert response.json()["code"] == "DUPLICATE_CHECKIN"
+
+        # Отметка не изменилась после отката
+        response = client.get(f"/checkins/{other.json()['id']}", headers=auth_headers)
+        assert response.json()["checkin_date"] == "2024-10-20"
+
+    def test_checkin_indexes_exist(self, test_db):
+        """Тест наличия индексов для выборок по привычке и дате"""
+        inspector = inspect(test_db.get_bind())
+        checkin_indexes = {i["name"]: i for i in inspector.get_indexes("checkins")}
+        habit_indexes = {i["name"] for i in inspector.get_indexes("habits")}
+
+        unique_index = checkin_indexes["uq_checkins_habit_date"]
+        assert unique_index["unique"]
+        assert unique_index["column_names"] == ["habit_id", "checkin_date"]
+        assert "ix_checkins_checkin_date" in checkin_indexes
+        assert "ix_habits_user_id" in habit_indexes
+
+    def test_duplicate_checkins_block_only_unique_index(self, tmp_path):
+        """Тест: дубли мешают только уникальному индексу, старт падает явно"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE habits (id INTEGER PRIMARY KEY, name VARCHAR(100), "
+                "periodicity INTEGER, user_id INTEGER)"
+            )
+            connection.exec_driver_sql(
+                "CREATE TABLE checkins (id INTEGER PRIMARY KEY, habit_id INTEGER, "
+                "checkin_date DATE, completed BOOLEAN)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO checkins VALUES (1, 1, '2024-01-01', 0), "
+                "(2, 1, '2024-01-01', 1), (3, 1, '2024-01-02', 1)"
+            )
+
+        with engine.connect() as connection:
+            with pytest.raises(RuntimeError, match="--dedupe-checkins"):
+                create_missing_indexes(connection)
+
+        indexes = {i["name"] for i in inspect(engine).get_indexes("checkins")}
+        assert "ix_checkins_checkin_date" in indexes
+        assert "uq_checkins_habit_date" not in indexes
+
+        with engine.begin() as connection:
+            assert dedupe_checkins(connection) == 1
+        with engine.connect() as connection:
+            create_missing_indexes(connection)
+            rows = connection.exec_driver_sql("SELECT id FROM checkins").all()
+
+        assert [row[0] for row in rows] == [2, 3]
+        indexes = {i["name"] for i in inspect(engine).get_indexes("checkins")}
+        assert "uq_checkins_habit_date" in indexes
+
+    def test_export_checkins_ndjson(self, client, sample_habit, auth_headers):
+        """Тест потоковой выгрузки отметок в NDJSON с фильтром по датам"""
+        for day in ("2024-10-01", "2024-10-02", "2024-10-03"):
+            client.post(
+                "/checkins",
+                json={
+                    "habit_id": sample_habit["id"],
+                    "checkin_date": day,
+                    "completed": day != "2024-10-02",
+                },
+                headers=auth_headers,
+            )
+
+        response = client.get(
+            "/checkins/export",
+            params={"from": "2024-10-02", "to": "2024-10-03"},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["checkin_date"] for row in rows] == ["2024-10-02", "2024-10-03"]
+        assert [row["completed"] for row in rows] == [False, True]
+
+    def test_export_checkins_csv(self, client, sample_checkin, auth_headers):
+        """Тест потоковой выгрузки отметок в CSV"""
+        response = client.get(
+            "/checkins/export", params={"format": "csv"}, headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+
+        lines = response.text.splitlines()
+        assert lines[0] == "id,habit_id,checkin_date,completed"
+        assert lines[1:] == [
+            f"{sample_checkin['id']},{sample_checkin['habit_id']},2024-01-15,True"
+        ]
+
+    def test_export_checkins_other_habit_empty(
+        self, client, sample_checkin, auth_headers
+    ):
+        """Тест выгрузки по чужой или несуществующей привычке"""
+        response = client.get(
+            "/checkins/export", params={"habit_id": 999}, headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert response.text == ""
+
+        response = client.get(
+            "/checkins/export", params={"format": "xml"}, headers=auth_headers
+        )
+        assert response.status_code == 422
+
+    def test_create_checkins_batch(self, client, sample_checkin, auth_headers):
+        """Тест пакетного создания отметок с результатом по каждой"""
+        habit_id = sample_checkin["habit_id"]
+        items = [
+            {"habit_id": habit_id, "checkin_date": "2024-02-01", "completed": True},
+            # Уже существует
+            {
+                "habit_id": habit_id,
+                "checkin_date": sample_checkin["checkin_date"],
+                "completed": True,
+            },
+            # Чужая или несуществующая привычка
+            {"habit_id": 999, "checkin_date": "2024-02-01", "completed": True},
+            {"habit_id": habit_id, "checkin_date": "2024-02-02", "completed": False},
+            # Повтор внутри пакета
+            {"habit_id": habit_id, "checkin_date": "2024-02-01", "completed": False},
+        ]
+        response = client.post(
+            "/checkins/batch", json={"items": items}, headers=auth_headers
+        )
+        assert response.status_code == 200
+        body = response.json()
+        assert (body["created"], body["duplicate"], body["not_found"]) == (2, 2, 1)
+        assert [r["status"] for r in body["results"]] == [
+            "created",
+            "duplicate",
+            "not_found",
+            "created",
+            "duplicate",
+        ]
+
+        created_id = body["results"][3]["id"]
+        response = client.get(f"/checkins/{created_id}", headers=auth_headers)
+        assert response.json()["checkin_date"] == "2024-02-02"
+        assert response.json()["completed"] is False
+
+    def test_create_checkins_batch_limits(self, client, sample_habit, auth_headers):
+        """Тест валидации размера пакета"""
+        response = client.post(
+            "/checkins/batch", json={"items": []}, headers=auth_headers
+        )
+        assert response.status_code == 422
+
+        items = [{"habit_id": sample_habit["id"], "checkin_date": "2024-01-01"}] * (
+            MAX_CHECKIN_BATCH_SIZE + 1
+        )
+        response = client.post(
+            "/checkins/batch", json={"items": items}, headers=auth_headers
+        )
+        assert response.status_code == 422
@@ -0,0 +1,171 @@
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import app.auth
+import app.database
+from app.aggregates import UPSERT_INSERTS
+from app.database import (
+    ASYNC_DRIVERS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    SQLITE_PRAGMAS,
+    current_request_scope,
+    enable_slow_query_log,
+    get_async_db,
+    make_async_url,
+    open_session,
+    pool_options,
+    slow_query_log,
+)
+
+
+class TestAsyncDatabaseUrl:
+    """Тесты подбора асинхронного драйвера"""
+
+    def test_sqlite_url_uses_aiosqlite(self):
+        url = make_async_url("sqlite:///./data/app.db")
+        assert url.drivername == "sqlite+aiosqlite"
+        assert url.database == "./data/app.db"
+
+    def test_postgres_driver_replaced(self):
+        url = make_async_url("postgresql+psycopg2://user:pw@db:5432/habits")
+        assert url.drivername == "postgresql+asyncpg"
+        assert url.password == "pw"
+        assert url.database == "habits"
+
+    def test_async_url_unchanged(self):
+        url = make_async_url("sqlite+aiosqlite:///:memory:")
+        assert url.drivername == "sqlite+aiosqlite"
+        assert url.database == ":memory:"
+
+    def test_every_backend_has_upsert(self):
+        """Каждый бэкенд с async-драйвером умеет upsert агрегатов"""
+        assert set(ASYNC_DRIVERS) <= set(UPSERT_INSERTS)
+
+    @pytest.mark.parametrize(
+        "url", ["oracle://user:pw@db/habits", "mysql+pymysql://user:pw@db/habits"]
+    )
+    def test_unsupported_backend_rejected(self, url):
+        with pytest.raises(ValueError):
+            make_async_url(url)
+
+
+class TestSqliteProfile:
+    """Тесты профиля производительности SQLite"""
+
+    def test_memory_database_has_no_pool_sizing(self):
+        assert pool_options("sqlite:///:memory:") == {}
+        assert pool_options("sqlite+aiosqlite://") == {}
+
+    def test_file_database_pool_sizing(self):
+        options = pool_options("sqlite:///./data/app.db")
+        assert options["pool_size"] == DB_POOL_SIZE
+        assert options["max_overflow"] == DB_MAX_OVERFLOW
+
+    def test_health_reports_active_pragmas(self, client):
+        response = client.get("/health")
+        assert response.status_code == 200
+        settings = response.json()["sqlite"]
+        assert settings["journal_mode"] == SQLITE_PRAGMAS["journal_mode"].lower()
+        assert settings["busy_timeout"] == SQLITE_PRAGMAS["busy_timeout"]
+        assert settings["cache_size"] == SQLITE_PRAGMAS["cache_size"]
+        assert settings["foreign_keys"] == 1
+        assert response.json()["pool"]["size"] == DB_POOL_SIZE
+
+
+@pytest.fixture
+def slow_engine():
+    """Движок в памяти, где каждый запрос считается медленным"""
+    slow_query_log.clear()
+    engine = create_engine("sqlite://")
+    enable_slow_query_log(engine, threshold_ms=0)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE checkins (id INTEGER, day DATE)"))
+    slow_query_log.clear()
+    yield engine
+    slow_query_log.clear()
+
+
+class TestSlowQueryLog:
+    """Тесты журнала медленных запросов"""
+
+    def test_records_statement_endpoint_and_plan(self, slow_engine):
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/checkins/7",
+            "route": SimpleNamespace(path="/checkins/{checkin_id}"),
+        }
+        token = current_request_scope.set(scope)
+        try:
+            with slow_engine.connect() as connection:
+                for day in ("2024-01-01", "2024-01-02"):
+                    connection.execute(
+                        text("SELECT id FROM checkins WHERE day >= :day LIMIT 10"),
+                        {"day": day},
+                    )
+        finally:
+            current_request_scope.reset(token)
+
+        entries = slow_query_log.entries()
+        assert len(entries) == 2
+        entry = entries[0]
+        assert entry["statement"] == "SELECT id FROM checkins WHERE day >= ? LIMIT ?"
+        assert entry["parameters"] == ["str"]
+        assert entry["endpoint"] == "GET /checkins/{checkin_id}"
+        # Полный скан таблицы виден в плане
+        assert any(step.startswith("SCAN checkins") for step in entry["plan"])
+
+    def test_fast_queries_skipped(self):
+        slow_query_log.clear()
+        engine = create_engine("sqlite://")
+        enable_slow_query_log(engine, threshold_ms=10_000)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+        assert slow_query_log.entries() == []
+
+    def test_admin_endpoint_requires_key(self, client, slow_engine, monkeypatch):
+        with slow_engine.connect() as connection:
+            connection.execute(text("SELECT count(*) FROM checkins"))
+
+        assert client.get("/admin/slow-queries").status_code == 404
+
+        monkeypatch.setattr(app.auth, "ADMIN_API_KEY", "admin-key")
+        response = client.get("/admin/slow-queries", headers={"X-API-Key": "wrong"})
+        assert response.status_code == 403
+
+        response = client.get("/admin/slow-queries", headers={"X-API-Key": "admin-key"})
+        assert response.status_code == 200
+        assert response.json()["entries"][0]["statement"].startswith("SELECT count")
+
+
+class TestSessionMode:
+    """Тесты сессии запроса в режимах DB_SESSION_MODE"""
+
+    def test_sync_session_closed_when_handler_raises(self, tmp_path, monkeypatch):
+        """Тест: исключение обработчика сразу возвращает соединение в пул"""
+        sync_engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        factory = sessionmaker(bind=sync_engine)
+        monkeypatch.setattr(
+            app.database,
+            "open_session",
+            functools.partial(open_session, sync_factory=factory, mode="sync"),
+        )
+
+        async def handle_request():
+            # Так FastAPI оборачивает зависимость с yield
+            with pytest.raises(RuntimeError):
+                async with asynccontextmanager(get_async_db)() as db:
+                    await db.execute(text("CREATE TABLE t (id INTEGER)"))
+                    assert sync_engine.pool.checkedout() == 1
+                    raise RuntimeError("handler failed")
+            return sync_engine.pool.checkedout()
+
+        assert asyncio.run(handle_request()) == 0
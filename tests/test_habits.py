@@ -1,3 +1,11 @@
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, select
+
+from app.models import Habit, backfill_habit_names, create_missing_columns
+from app.pagination import DEFAULT_PAGE_SIZE
+
+
 class TestHabitsCRUD:
     """Тесты CRUD операций для привычек"""
 
@@ -23,9 +31,50 @@ class TestHabitsCRUD:
         response = client.get("/habits", headers=auth_headers)
         assert response.status_code == 200
         habits = response.json()
+        assert isinstance(habits, list)
         assert len(habits) == 1
         assert habits[0]["name"] == "Тестовая привычка"
 
+        response = client.get("/habits", params={"limit": 10}, headers=auth_headers)
+        body = response.json()
+        assert body["items"] == habits
+        assert body["next_cursor"] is None
+
+    def test_get_habits_pagination(self, client, auth_headers):
+        """Тест курсорной пагинации привычек"""
+        for i in range(5):
+            client.post(
+                "/habits",
+                json={"name": f"Привычка {i}", "periodicity": 1},
+                headers=auth_headers,
+            )
+
+        seen = []
+        params = {"limit": 2}
+        while True:
+            response = client.get("/habits", params=params, headers=auth_headers)
+            assert response.status_code == 200
+            body = response.json()
+            assert len(body["items"]) <= 2
+            seen.extend(habit["id"] for habit in body["items"])
+            if body["next_cursor"] is None:
+                break
+            params = {"limit": 2, "after": body["next_cursor"]}
+
+        assert len(seen) == 5
+        assert seen == sorted(seen)
+
+    def test_get_habits_invalid_cursor(self, client, auth_headers):
+        """Тест невалидного курсора"""
+        response = client.get(
+            "/habits", params={"after": "not-a-cursor"}, headers=auth_headers
+        )
+        assert response.status_code == 400
+        assert response.json()["code"] == "INVALID_CURSOR"
+
+        response = client.get("/habits", params={"limit": 0}, headers=auth_headers)
+        assert response.status_code == 422
+
     def test_get_habit_by_id(self, client, sample_habit, auth_headers):
         """Тест получения привычки по ID"""
         habit_id = sample_habit["id"]
@@ -35,6 +84,60 @@ class TestHabitsCRUD:
         assert habit["name"] == "Тестовая привычка"
         assert habit["id"] == habit_id
 
+    def test_get_habit_detailed_window(self, client, sample_habit, auth_headers):
+        """Тест окна отметок в детальном представлении привычки"""
+        habit_id = sample_habit["id"]
+        batch = {
+            "items": [
+                {
+                    "habit_id": habit_id,
+                    "checkin_date": f"2024-01-{day:02d}",
+                    "completed": True,
+                }
+                for day in range(1, 11)
+            ]
+        }
+        client.post("/checkins/batch", json=batch, headers=auth_headers)
+
+        response = client.get(
+            f"/habits/{habit_id}/detailed",
+            params={"from": "2024-01-03", "to": "2024-01-08", "limit": 4},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        dates = [c["checkin_date"] for c in response.json()["checkins"]]
+        assert dates == ["2024-01-08", "2024-01-07", "2024-01-06", "2024-01-05"]
+
+        response = client.get(f"/habits/{habit_id}/detailed", headers=auth_headers)
+        assert len(response.json()["checkins"]) == 10
+
+    def test_get_habit_detailed_default_returns_all(
+        self, client, sample_habit, auth_headers
+    ):
+        """Тест: без from/to/limit отдаются все отметки по возрастанию даты"""
+        habit_id = sample_habit["id"]
+        days = [
+            date(2024, 1, 1) + timedelta(days=i) for i in range(DEFAULT_PAGE_SIZE + 10)
+        ]
+        batch = {
+            "items": [
+                {"habit_id": habit_id, "checkin_date": str(day), "completed": True}
+                for day in reversed(days)
+            ]
+        }
+        client.post("/checkins/batch", json=batch, headers=auth_headers)
+
+        response = client.get(f"/habits/{habit_id}/detailed", headers=auth_headers)
+        assert response.status_code == 200
+        dates = [c["checkin_date"] for c in response.json()["checkins"]]
+        assert dates == [str(day) for day in days]
+
+        response = client.get(
+            f"/habits/{habit_id}/detailed", params={"limit": 2}, headers=auth_headers
+        )
+        dates = [c["checkin_date"] for c in response.json()["checkins"]]
+        assert dates == [str(days[-1]), str(days[-2])]
+
     def test_get_habit_not_found(self, client, auth_headers):
         """Тест получения несуществующей привычки"""
         response = client.get("/habits/999", headers=auth_headers)
@@ -123,3 +226,54 @@ class TestHabitsCRUD:
         # Проверяем что скрипт экранирован
         assert "<script>" not in name
         assert "&lt;script&gt;" in name
+
+    def test_habit_name_escaped_once_on_write(self, client, auth_headers, test_db):
+        """Тест: название экранируется при записи и одинаково во всех ответах"""
+        raw = "<b>Tom & Jerry</b>"
+        escaped = "&lt;b&gt;Tom &amp; Jerry&lt;/b&gt;"
+        created = client.post(
+            "/habits", json={"name": raw, "periodicity": 1}, headers=auth_headers
+        )
+        assert created.json()["name"] == escaped
+        habit_id = created.json()["id"]
+
+        responses = [
+            client.get(f"/habits/{habit_id}", headers=auth_headers).json(),
+            client.get(f"/habits/{habit_id}/detailed", headers=auth_headers).json(),
+            client.get("/habits", headers=auth_headers).json()[0],
+        ]
+        assert [habit["name"] for habit in responses] == [escaped] * 3
+
+        # Исходное название хранится без изменений, чтение его не трогает
+        row = test_db.execute(
+            select(Habit.name, Habit.name_html).where(Habit.id == habit_id)
+        ).one()
+        assert tuple(row) == (raw, escaped)
+
+        renamed = client.put(
+            f"/habits/{habit_id}",
+            json={"name": "a < b", "periodicity": 1},
+            headers=auth_headers,
+        )
+        assert renamed.json()["name"] == "a &lt; b"
+
+    def test_backfill_habit_names(self, tmp_path):
+        """Тест: старая база получает столбец name_html и заполняет его"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE habits (id INTEGER PRIMARY KEY, name VARCHAR(100), "
+                "periodicity INTEGER, user_id INTEGER)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO habits VALUES (1, 'Read & write', 1, 1), (2, 'Run', 1, 1)"
+            )
+
+        with engine.begin() as connection:
+            create_missing_columns(connection)
+            assert backfill_habit_names(connection) == 2
+            assert backfill_habit_names(connection) == 0
+            names = connection.execute(
+                select(Habit.name_html).order_by(Habit.id)
+            ).scalars()
+            assert list(names) == ["Read &amp; write", "Run"]
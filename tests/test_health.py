@@ -1,6 +1,14 @@
+import asyncio
+import os
+import subprocess
+import sys
+
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
 
+import app.main as main_module
 from app.main import app
+from app.readiness import ReadinessProbe
 
 client = TestClient(app)
 
@@ -35,3 +43,87 @@ def test_login_endpoint_exists():
     """Проверка что эндпоинт логина доступен"""
     response = client.post("/login", json={"username": "test", "password": "test"})
     assert response.status_code != 404
+
+
+def test_health_live_not_rate_limited():
+    """Liveness не обращается к БД и не попадает под rate limit"""
+    for _ in range(60):
+        response = client.get("/health/live")
+        assert response.status_code == 200
+    assert response.json() == {"status": "alive"}
+
+
+def test_health_ready(test_db, monkeypatch):
+    """Readiness отдает результат фоновой проверки"""
+    probe = ReadinessProbe(
+        create_async_engine("sqlite+aiosqlite:///./test.db"), interval=5, timeout=2
+    )
+    monkeypatch.setattr(main_module, "readiness", probe)
+
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting"
+
+    asyncio.run(probe.refresh())
+    for _ in range(60):
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+
+    body = response.json()
+    assert body["status"] == "ready"
+    assert body["database"]["status"] == "ok"
+    assert body["database"]["latency_ms"] >= 0
+    assert body["pool"]["checked_out"] == 0
+    assert body["migrations"]["pending"] == []
+
+
+def test_health_ready_pending_migrations(tmp_path):
+    """Readiness не готов, пока схема базы не совпадает с моделями"""
+    probe = ReadinessProbe(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'empty.db'}"),
+        interval=5,
+        timeout=2,
+    )
+    asyncio.run(probe.refresh())
+
+    response = probe.response()
+    body = response.body
+    assert response.status_code == 503
+    assert b"table users" in body
+    assert b'"status": "not_ready"' in body
+
+
+def test_health_ready_stale():
+    """Устаревший результат означает, что фоновая проверка не работает"""
+    probe = ReadinessProbe(create_async_engine("sqlite+aiosqlite://"), 5, 2)
+    probe.checked_at = 0.0
+
+    assert probe.response().status_code == 503
+
+
+def test_memory_database_shared_by_startup_and_endpoints():
+    """С sqlite:///:memory: старт и эндпоинты работают с одной базой"""
+    script = (
+        "from fastapi.testclient import TestClient\n"
+        "from app.main import app\n"
+        "with TestClient(app) as client:\n"
+        "    response = client.post('/login', json={\n"
+        "        'username': 'test_user', 'password': 'test_password'})\n"
+        "    print(response.status_code)\n"
+    )
+    env = {
+        **os.environ,
+        "DATABASE_URL": "sqlite:///:memory:",
+        "ASYNC_DATABASE_URL": "",
+        "DB_SESSION_MODE": "async",
+        "LOG_LEVEL": "ERROR",
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        env=env,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "200"
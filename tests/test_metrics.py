@@ -0,0 +1,105 @@
+import threading
+
+from sqlalchemy import create_engine, text
+
+import app.main as main_module
+from app.database import timed_pool_class
+from app.metrics import (
+    Counter,
+    Histogram,
+    db_pool_checkout_seconds,
+    db_statement_duration_seconds,
+    instrument_engine,
+    statement_fingerprint,
+)
+
+
+class TestMetrics:
+    """Тесты метрик Prometheus"""
+
+    def test_histogram_merges_thread_shards(self):
+        """Тест: наблюдения из разных потоков суммируются при чтении"""
+        histogram = Histogram("h", "test", ("route",), buckets=(0.1, 1.0))
+
+        def observe():
+            for value in (0.05, 0.5, 5.0):
+                histogram.observe(("/x",), value)
+
+        threads = [threading.Thread(target=observe) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        lines = histogram.render()
+        assert 'h_bucket{route="/x",le="0.1"} 4' in lines
+        assert 'h_bucket{route="/x",le="1.0"} 8' in lines
+        assert 'h_bucket{route="/x",le="+Inf"} 12' in lines
+        assert 'h_count{route="/x"} 12' in lines
+
+    def test_gauge_and_label_escaping(self):
+        """Тест: отрицательные приращения и экранирование меток"""
+        gauge = Counter("g", "test", ("name",), kind="gauge")
+        gauge.inc(('a"b',), 2)
+        gauge.inc(('a"b',), -1)
+
+        assert gauge.render()[-1] == 'g{name="a\\"b"} 1'
+
+    def test_statement_fingerprint(self):
+        """Тест: литералы, IN и пачки VALUES не плодят отдельных серий"""
+        assert statement_fingerprint(
+            "SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'x'  LIMIT 10"
+        ) == statement_fingerprint(
+            "SELECT * FROM t WHERE id IN (?) AND name = 'y' LIMIT 5"
+        )
+        assert statement_fingerprint(
+            "INSERT INTO t (a, b) VALUES (?, ?, 0), (?, ?, 1)"
+        ) == statement_fingerprint("INSERT INTO t (a, b) VALUES (?, ?, 0)")
+
+    def test_engine_instrumentation(self):
+        """Тест: время запросов и выдачи соединений из пула"""
+        engine = create_engine("sqlite://", poolclass=timed_pool_class("sqlite://"))
+        instrument_engine(engine, "test-engine")
+
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 42"))
+        # Пул пересоздается с тем же классом и слушателями
+        engine.dispose()
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 42"))
+
+        series = db_statement_duration_seconds.values()[("SELECT ?",)]
+        assert sum(series[:-1]) >= 2
+        checkouts = db_pool_checkout_seconds.values()[("test-engine",)]
+        assert sum(checkouts[:-1]) == 2
+
+    def test_metrics_endpoint(self, client, auth_headers, sample_habit, monkeypatch):
+        """Тест: /metrics отдает гистограммы по шаблонам маршрутов"""
+        monkeypatch.setattr(main_module, "METRICS_TOKEN", "metrics-token")
+        client.get(f"/habits/{sample_habit['id']}", headers=auth_headers)
+        client.post("/login", json={"username": "test_user", "password": "wrong"})
+
+        response = client.get(
+            "/metrics", headers={"Authorization": "Bearer metrics-token"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert (
+            'http_request_duration_seconds_count{method="GET",route="/habits/{habit_id}"}'
+            in body
+        )
+        assert 'http_responses_total{method="POST",route="/login",status="401"}' in body
+        assert "http_requests_in_flight 1" in body
+        assert "password_hash_seconds_total" in body
+        assert "rate_limit_rejected_total 0" in body
+
+    def test_metrics_require_token(self, client, monkeypatch):
+        """Тест: без METRICS_TOKEN метрик нет, с ним нужен верный токен"""
+        assert client.get("/metrics").status_code == 404
+
+        monkeypatch.setattr(main_module, "METRICS_TOKEN", "metrics-token")
+        assert client.get("/metrics").status_code == 401
+        response = client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+        assert response.status_code == 401
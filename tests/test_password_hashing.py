@@ -0,0 +1,56 @@
+import asyncio
+import os
+
+import pytest
+
+from app.password_hashing import PasswordHasherBusy, password_hasher, pwd_context
+
+
+class TestPasswordHasher:
+    """Тесты пула процессов для bcrypt"""
+
+    def test_login_records_hash_metrics(self, client):
+        """Тест: вход проходит через пул и учитывается в метриках"""
+        completed = password_hasher.completed
+
+        response = client.post(
+            "/login", json={"username": "test_user", "password": "test_password"}
+        )
+        assert response.status_code == 200
+
+        stats = password_hasher.stats()
+        assert stats["completed"] == completed + 1
+        assert stats["avg_hash_ms"] > 0
+        assert stats["pending"] == 0
+
+    def test_full_queue_fails_fast(self, client, monkeypatch):
+        """Тест: при заполненной очереди вход отклоняется с 503"""
+        monkeypatch.setattr(password_hasher, "max_queue", 0)
+        rejected = password_hasher.rejected
+
+        response = client.post(
+            "/login", json={"username": "test_user", "password": "test_password"}
+        )
+        assert response.status_code == 503
+        assert response.json()["code"] == "SERVICE_UNAVAILABLE"
+        assert password_hasher.rejected == rejected + 1
+
+    def test_hash_in_pool_verifies_inline(self):
+        """Тест: хеш из пула совместим с синхронной проверкой"""
+        hashed = asyncio.run(password_hasher.hash("s3cret"))
+        assert pwd_context.verify("s3cret", hashed)
+
+    def test_dead_worker_pool_recreated(self, client):
+        """Тест: после гибели рабочего процесса пул пересоздается"""
+        restarts = password_hasher.pool_restarts
+
+        # Задача завершает рабочий процесс, и пул становится сломанным
+        with pytest.raises(PasswordHasherBusy):
+            asyncio.run(password_hasher._run(os._exit, 1))
+        assert password_hasher.pool_restarts == restarts + 1
+
+        response = client.post(
+            "/login", json={"username": "test_user", "password": "test_password"}
+        )
+        assert response.status_code == 200
+        assert password_hasher.stats()["pending"] == 0
@@ -0,0 +1,97 @@
+import pytest
+
+
+class TestQueryBudgets:
+    """
+    Бюджеты SQL-запросов на один HTTP-запрос.
+
+    Бюджет считается при прогретых кэшах принципала и версии данных:
+    первый запрос после входа дополнительно читает пользователя.
+    """
+
+    def test_create_checkin(self, client, auth_headers, sample_habit, query_budget):
+        """Тест: POST /checkins - вставка с проверкой владельца и два счетчика"""
+        with query_budget(3):
+            response = client.post(
+                "/checkins",
+                json={
+                    "habit_id": sample_habit["id"],
+                    "checkin_date": "2024-02-01",
+                    "completed": True,
+                },
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 200
+
+    def test_create_checkin_foreign_habit(
+        self, client, auth_headers, sample_habit, query_budget
+    ):
+        """Тест: отметка для чужой привычки отклоняется одним запросом"""
+        with query_budget(1):
+            response = client.post(
+                "/checkins",
+                json={
+                    "habit_id": sample_habit["id"] + 1000,
+                    "checkin_date": "2024-02-01",
+                    "completed": True,
+                },
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 404
+
+    def test_get_habit_detailed(
+        self, client, auth_headers, sample_checkin, query_budget
+    ):
+        """Тест: GET /habits/{id}/detailed - привычка и окно отметок"""
+        url = f"/habits/{sample_checkin['habit_id']}/detailed"
+
+        with query_budget(2):
+            response = client.get(url, headers=auth_headers)
+
+        assert response.status_code == 200
+        assert len(response.json()["checkins"]) == 1
+
+    def test_batch_does_not_grow_with_size(
+        self, client, auth_headers, sample_habit, query_budget
+    ):
+        """Тест: пакет отметок укладывается в бюджет независимо от размера"""
+        items = [
+            {
+                "habit_id": sample_habit["id"],
+                "checkin_date": f"2024-03-{day:02d}",
+                "completed": day % 2 == 0,
+            }
+            for day in range(1, 31)
+        ]
+
+        with query_budget(5):
+            response = client.post(
+                "/checkins/batch", json={"items": items}, headers=auth_headers
+            )
+
+        assert response.status_code == 200
+        assert response.json()["created"] == 30
+
+    def test_list_endpoints(self, client, auth_headers, sample_checkin, query_budget):
+        """Тест: списки и статистика читаются одним запросом"""
+        habit_id = sample_checkin["habit_id"]
+        for url in [
+            "/habits",
+            f"/habits/{habit_id}",
+            "/habits/stats",
+            "/checkins",
+            f"/checkins/{sample_checkin['id']}",
+            "/stats",
+        ]:
+            with query_budget(1):
+                response = client.get(url, headers=auth_headers)
+
+            assert response.status_code == 200, url
+
+    def test_budget_exceeded(self, client, auth_headers, sample_habit, query_budget):
+        """Тест: превышение бюджета проваливает тест со списком запросов"""
+        with pytest.raises(AssertionError, match=r"(?s)budget 0:.*SELECT"):
+            with query_budget(0):
+                client.get("/habits", headers=auth_headers)
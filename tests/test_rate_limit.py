@@ -0,0 +1,194 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from app.mmap_bucket import MmapBucketStore
+from app.rate_limit import create_store, limiter
+from app.token_bucket import TokenBucketStore, parse_rate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    """Тесты GCRA-лимитера"""
+
+    def test_parse_rate(self):
+        """Тест разбора строки лимита"""
+        assert parse_rate("50/minute") == (50, 60.0)
+        assert parse_rate("5/seconds") == (5, 1.0)
+        with pytest.raises(ValueError):
+            parse_rate("0/minute")
+        with pytest.raises(ValueError):
+            parse_rate("10/fortnight")
+
+    def test_burst_then_refill(self):
+        """Тест: пачка до лимита, затем токены возвращаются со временем"""
+        clock = FakeClock()
+        store = TokenBucketStore(max_keys=100, clock=clock)
+
+        for _ in range(3):
+            assert store.acquire("ip", 3, 60) is None
+        assert store.acquire("ip", 3, 60) == pytest.approx(20.0)
+        assert store.acquire("other-ip", 3, 60) is None
+
+        clock.now += 20
+        assert store.acquire("ip", 3, 60) is None
+        assert store.acquire("ip", 3, 60) is not None
+
+    def test_memory_cap(self):
+        """Тест: число ключей не превышает потолок при переборе IP"""
+        store = TokenBucketStore(max_keys=64, shards=4, clock=FakeClock())
+
+        for i in range(10_000):
+            store.acquire(f"10.0.{i // 256}.{i % 256}", 50, 60)
+
+        assert len(store) <= 64
+        assert store.evicted == 10_000 - len(store)
+
+    def test_idle_keys_dropped(self):
+        """Тест: ключи с полным ведром не занимают память"""
+        clock = FakeClock()
+        store = TokenBucketStore(max_keys=100, shards=1, clock=clock)
+        for i in range(10):
+            store.acquire(i, 10, 10)
+
+        clock.now += 10
+        store.acquire("new", 10, 10)
+
+        assert len(store) == 1
+        assert store.evicted == 0
+
+    def test_health_returns_429(self, client):
+        """Тест: превышение лимита дает 429 с Retry-After"""
+        statuses = [client.get("/health").status_code for _ in range(51)]
+
+        assert statuses[:50] == [200] * 50
+        assert statuses[50] == 429
+        response = client.get("/health")
+        assert response.json()["error"]["code"] == "rate_limit"
+        assert int(response.headers["retry-after"]) >= 1
+        assert limiter.rejected == 2
+
+
+def _worker_hits(path, attempts, results):
+    store = MmapBucketStore(path, slots=1024)
+    allowed = sum(
+        store.acquire("10.0.0.1", 100, 86400) is None for _ in range(attempts)
+    )
+    results.put(allowed)
+
+
+class TestMmapBucketStore:
+    """Тесты общего для воркеров хранилища лимитов"""
+
+    def test_burst_then_refill(self, tmp_path):
+        """Тест: то же поведение GCRA, что и у хранилища в памяти"""
+        clock = FakeClock()
+        store = MmapBucketStore(str(tmp_path / "rl"), slots=1024, clock=clock)
+
+        for _ in range(3):
+            assert store.acquire("ip", 3, 60) is None
+        assert store.acquire("ip", 3, 60) == pytest.approx(20.0)
+        assert len(store) == 1
+
+        clock.now += 20
+        assert store.acquire("ip", 3, 60) is None
+        store.clear()
+        assert len(store) == 0
+
+    def test_fixed_size(self, tmp_path):
+        """Тест: файл не растет при переборе IP"""
+        path = str(tmp_path / "rl")
+        store = MmapBucketStore(path, slots=64, clock=FakeClock())
+        size = os.path.getsize(store.path)
+
+        for i in range(5_000):
+            assert store.acquire(f"10.0.{i // 256}.{i % 256}", 50, 60) is None
+
+        assert os.path.getsize(store.path) == size
+        assert len(store) == 64
+        assert store.evicted == 5_000 - 64
+
+    def test_len_reads_shared_counter(self, tmp_path):
+        """Тест: счетчик занятых слотов в заголовке общий для воркеров"""
+        path = str(tmp_path / "rl")
+        store = MmapBucketStore(path, slots=1024, clock=FakeClock())
+        other = MmapBucketStore(path, slots=1024, clock=FakeClock())
+
+        for key in ("a", "b", "c"):
+            assert store.acquire(key, 3, 60) is None
+        assert other.acquire("a", 3, 60) is None
+        assert other.acquire("d", 3, 60) is None
+
+        assert len(store) == len(other) == 4
+        other.clear()
+        assert len(store) == 0
+
+    def test_other_layout_uses_own_file(self, tmp_path):
+        """Тест: другой размер таблицы не меняет файл работающих воркеров"""
+        path = str(tmp_path / "rl")
+        store = MmapBucketStore(path, slots=64, clock=FakeClock())
+        other = MmapBucketStore(path, slots=128, clock=FakeClock())
+
+        assert other.path != store.path
+        assert os.path.getsize(store.path) == store.size
+        assert store.acquire("ip", 3, 60) is None
+
+    def test_unexpected_layout_rejected(self, tmp_path):
+        """Тест: чужой файл по тому же пути не переразмечается"""
+        path = str(tmp_path / "rl")
+        store = MmapBucketStore(path, slots=64)
+        store.close()
+        with open(store.path, "r+b") as f:
+            f.write(b"garbage!")
+
+        with pytest.raises(RuntimeError, match="unexpected layout"):
+            MmapBucketStore(path, slots=64)
+        assert os.path.getsize(store.path) == store.size
+
+    def test_clear_waits_for_acquiring_threads(self, tmp_path):
+        """Тест: clear не снимает блокировку окна, которую держит другой поток"""
+        store = MmapBucketStore(str(tmp_path / "rl"), slots=64, clock=FakeClock())
+        window_lock = store._thread_locks[0]
+        window_lock.acquire()
+        cleared = threading.Event()
+        thread = threading.Thread(target=lambda: (store.clear(), cleared.set()))
+        thread.start()
+
+        assert not cleared.wait(0.2)
+        window_lock.release()
+        thread.join(5)
+        assert cleared.is_set()
+
+    def test_limit_shared_between_processes(self, tmp_path):
+        """Тест: лимит общий для всех воркеров, а не умножается на их число"""
+        path = str(tmp_path / "rl")
+        MmapBucketStore(path, slots=1024).close()
+
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [
+            context.Process(target=_worker_hits, args=(path, 60, results))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        allowed = sum(results.get(timeout=30) for _ in workers)
+        for worker in workers:
+            worker.join()
+
+        assert allowed == 100
+
+    def test_create_store(self):
+        """Тест выбора бэкенда по имени"""
+        assert isinstance(create_store("memory"), TokenBucketStore)
+        with pytest.raises(ValueError):
+            create_store("redis")
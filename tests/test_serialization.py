@@ -0,0 +1,42 @@
+import pytest
+from fastapi.responses import ORJSONResponse
+
+from app import serialization
+
+
+@pytest.fixture
+def fast_serialization(monkeypatch):
+    monkeypatch.setattr(serialization, "FAST_SERIALIZATION", True)
+    monkeypatch.setattr(serialization, "DefaultResponse", ORJSONResponse)
+
+
+class TestFastSerialization:
+    """Тесты быстрой сериализации списков"""
+
+    @pytest.mark.parametrize(
+        "url", ["/habits", "/checkins", "/habits/{habit_id}/detailed"]
+    )
+    def test_same_body_as_validated(
+        self, client, auth_headers, sample_checkin, fast_serialization, url, request
+    ):
+        """Тест: orjson без проверки дает то же тело, что и response_model"""
+        url = url.format(habit_id=sample_checkin["habit_id"])
+        fast = client.get(url, headers=auth_headers)
+
+        request.getfixturevalue("monkeypatch").undo()
+        validated = client.get(url, headers=auth_headers)
+
+        assert fast.status_code == validated.status_code == 200
+        assert fast.json() == validated.json()
+        assert fast.headers["etag"] == validated.headers["etag"]
+
+    def test_dependency_headers_kept(
+        self, client, auth_headers, sample_habit, fast_serialization
+    ):
+        """Тест: заголовки зависимостей и middleware сохраняются"""
+        response = client.get("/habits", headers=auth_headers)
+
+        assert response.headers["cache-control"] == "private, no-cache"
+        assert response.headers["content-type"] == "application/json"
+        assert response.headers["x-content-type-options"] == "nosniff"
+        assert response.json()[0]["name"] == sample_habit["name"]
@@ -1,3 +1,8 @@
+from app.aggregates import find_drift, rebuild_aggregates
+from app.models import UserStats
+from app.versioning import data_versions
+
+
 class TestStats:
     """Тесты для статистики"""
 
@@ -92,3 +97,223 @@ class TestStats:
         assert response.status_code == 403
         response = client.get("/habits/1/stats")
         assert response.status_code == 403
+
+    def test_aggregates_match_raw_data(self, client, auth_headers, test_db):
+        """Тест: агрегаты совпадают с сырыми данными после любых изменений"""
+        habits = [
+            client.post(
+                "/habits",
+                json={"name": f"П{i}", "periodicity": 1},
+                headers=auth_headers,
+            ).json()
+            for i in range(3)
+        ]
+        first = client.post(
+            "/checkins",
+            json={
+                "habit_id": habits[0]["id"],
+                "checkin_date": "2024-10-01",
+                "completed": True,
+            },
+            headers=auth_headers,
+        ).json()
+        client.post(
+            "/checkins/batch",
+            json={
+                "items": [
+                    {
+                        "habit_id": habits[1]["id"],
+                        "checkin_date": "2024-10-01",
+                        "completed": True,
+                    },
+                    {
+                        "habit_id": habits[1]["id"],
+                        "checkin_date": "2024-10-02",
+                        "completed": False,
+                    },
+                    {
+                        "habit_id": habits[2]["id"],
+                        "checkin_date": "2024-10-01",
+                        "completed": True,
+                    },
+                ]
+            },
+            headers=auth_headers,
+        )
+        # Дубликат не должен менять агрегаты
+        client.post(
+            "/checkins",
+            json={
+                "habit_id": habits[0]["id"],
+                "checkin_date": "2024-10-01",
+                "completed": True,
+            },
+            headers=auth_headers,
+        )
+        # Перенос отметки на другую привычку с изменением статуса
+        client.put(
+            f"/checkins/{first['id']}",
+            json={
+                "habit_id": habits[1]["id"],
+                "checkin_date": "2024-10-05",
+                "completed": False,
+            },
+            headers=auth_headers,
+        )
+        client.delete(f"/habits/{habits[2]['id']}", headers=auth_headers)
+
+        assert find_drift(test_db.connection()) == []
+
+        stats = client.get("/stats", headers=auth_headers).json()
+        assert stats["total_habits"] == 2
+        assert stats["total_checkins"] == 3
+        assert stats["completed_checkins"] == 1
+
+    def test_rebuild_repairs_drift(self, client, sample_checkin, auth_headers, test_db):
+        """Тест пересчета агрегатов из сырых данных"""
+        test_db.query(UserStats).update({UserStats.total_checkins: 42})
+        test_db.commit()
+        assert find_drift(test_db.connection()) != []
+
+        rebuild_aggregates(test_db.connection())
+        test_db.commit()
+
+        assert find_drift(test_db.connection()) == []
+        stats = client.get("/stats", headers=auth_headers).json()
+        assert stats["total_checkins"] == 1
+
+    def test_rebuild_keeps_version_of_user_without_habits(
+        self, client, auth_headers, test_db
+    ):
+        """Тест: пересчет не сбрасывает версию данных пользователя без привычек"""
+        habit = client.post(
+            "/habits",
+            json={"name": "Временная", "periodicity": 1},
+            headers=auth_headers,
+        ).json()
+        client.delete(f"/habits/{habit['id']}", headers=auth_headers)
+        etag = client.get("/habits", headers=auth_headers).headers["etag"]
+        version = test_db.query(UserStats.data_version).scalar()
+
+        rebuild_aggregates(test_db.connection())
+        test_db.commit()
+        data_versions.clear()
+
+        assert test_db.query(UserStats.data_version).scalar() > version
+        response = client.get(
+            "/habits", headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_habit_stats_isolated_per_habit(self, client, auth_headers):
+        """Тест: статистика привычки не включает отметки других привычек"""
+        habits = [
+            client.post(
+                "/habits",
+                json={"name": f"П{i}", "periodicity": 1},
+                headers=auth_headers,
+            ).json()
+            for i in range(2)
+        ]
+        for day in ("2024-10-01", "2024-10-02", "2024-10-03"):
+            client.post(
+                "/checkins",
+                json={
+                    "habit_id": habits[0]["id"],
+                    "checkin_date": day,
+                    "completed": True,
+                },
+                headers=auth_headers,
+            )
+        client.post(
+            "/checkins",
+            json={
+                "habit_id": habits[1]["id"],
+                "checkin_date": "2024-10-01",
+                "completed": True,
+            },
+            headers=auth_headers,
+        )
+
+        stats = client.get(
+            f"/habits/{habits[0]['id']}/stats", headers=auth_headers
+        ).json()
+        assert stats["total_checkins"] == 3
+        assert stats["actual_completions"] == 3
+        assert stats["longest_streak"] == 3
+        assert stats["expected_completions"] >= 3
+
+        stats = client.get(
+            f"/habits/{habits[1]['id']}/stats", headers=auth_headers
+        ).json()
+        assert stats["total_checkins"] == 1
+        assert stats["longest_streak"] == 1
+
+    def test_all_habit_stats(self, client, auth_headers):
+        """Тест статистики по всем привычкам одним запросом"""
+        habits = [
+            client.post(
+                "/habits",
+                json={"name": f"П{i}", "periodicity": 1},
+                headers=auth_headers,
+            ).json()
+            for i in range(3)
+        ]
+        checkins = [
+            (habits[0]["id"], "2024-10-01", True),
+            (habits[0]["id"], "2024-10-02", False),
+            (habits[0]["id"], "2024-11-01", True),
+            (habits[1]["id"], "2024-10-15", True),
+        ]
+        for habit_id, day, completed in checkins:
+            client.post(
+                "/checkins",
+                json={
+                    "habit_id": habit_id,
+                    "checkin_date": day,
+                    "completed": completed,
+                },
+                headers=auth_headers,
+            )
+
+        response = client.get("/habits/stats", headers=auth_headers)
+        assert response.status_code == 200
+        stats = response.json()
+        assert [s["habit_id"] for s in stats] == [h["id"] for h in habits]
+        assert [s["total_checkins"] for s in stats] == [3, 1, 0]
+        assert [s["completed_checkins"] for s in stats] == [2, 1, 0]
+        assert stats[0]["completion_rate"] == round(2 / 3 * 100, 2)
+        assert stats[2]["completion_rate"] == 0.0
+
+        response = client.get(
+            "/habits/stats",
+            params={"from": "2024-10-01", "to": "2024-10-31"},
+            headers=auth_headers,
+        )
+        stats = response.json()
+        assert [s["total_checkins"] for s in stats] == [2, 1, 0]
+        assert [s["completed_checkins"] for s in stats] == [1, 1, 0]
+
+        response = client.get("/habits/stats")
+        assert response.status_code == 403
+
+    def test_stats_habit_name_escaped(self, client, auth_headers):
+        """Тест: статистика отдает название привычки экранированным"""
+        habit = client.post(
+            "/habits",
+            json={"name": "<script>alert(1)</script>", "periodicity": 1},
+            headers=auth_headers,
+        ).json()
+        escaped = "&lt;script&gt;alert(1)&lt;/script&gt;"
+
+        names = [
+            client.get(f"/habits/{habit['id']}/stats", headers=auth_headers).json()[
+                "habit_name"
+            ],
+            client.get("/habits/stats", headers=auth_headers).json()[0]["habit_name"],
+            client.get(
+                "/habits/stats", params={"from": "2024-01-01"}, headers=auth_headers
+            ).json()[0]["habit_name"],
+        ]
+        assert names == [escaped] * 3
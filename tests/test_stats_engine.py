@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+from app.stats_engine import compute_adherence
+
+
+def daily(start: date, days: int, completed: bool = True):
+    return [(start + timedelta(days=i), completed) for i in range(days)]
+
+
+class TestStatsEngine:
+    """Тесты расчета соблюдения привычки и серий"""
+
+    def test_no_checkins(self):
+        """Тест пустой истории"""
+        stats = compute_adherence(1, [], date(2024, 1, 10))
+        assert stats["expected_completions"] == 0
+        assert stats["current_streak"] == 0
+        assert stats["adherence_rate"] == 0.0
+
+    def test_daily_streaks(self):
+        """Тест серий ежедневной привычки с пропуском"""
+        checkins = daily(date(2024, 1, 1), 3) + daily(date(2024, 1, 5), 5)
+        stats = compute_adherence(1, checkins, date(2024, 1, 9))
+
+        assert stats["expected_completions"] == 9
+        assert stats["actual_completions"] == 8
+        assert stats["longest_streak"] == 5
+        assert stats["current_streak"] == 5
+
+    def test_current_period_in_progress_keeps_streak(self):
+        """Тест: незавершенный текущий период не обрывает серию"""
+        checkins = daily(date(2024, 1, 1), 3)
+        assert compute_adherence(1, checkins, date(2024, 1, 4))["current_streak"] == 3
+        assert compute_adherence(1, checkins, date(2024, 1, 5))["current_streak"] == 0
+
+    def test_weekly_periodicity(self):
+        """Тест: для еженедельной привычки считаются недели, а не дни"""
+        checkins = [
+            (date(2024, 1, 1), True),
+            (date(2024, 1, 3), True),  # та же неделя
+            (date(2024, 1, 9), False),
+            (date(2024, 1, 10), True),
+            (date(2024, 1, 22), True),  # пропущена неделя 15-21
+        ]
+        stats = compute_adherence(7, checkins, date(2024, 1, 28))
+
+        assert stats["expected_completions"] == 4
+        assert stats["actual_completions"] == 3
+        assert stats["adherence_rate"] == 75.0
+        assert stats["longest_streak"] == 2
+        assert stats["current_streak"] == 1
+
+    def test_uncompleted_checkins_count_as_missed(self):
+        """Тест: невыполненные отметки не продлевают серию"""
+        checkins = daily(date(2024, 1, 1), 2) + [(date(2024, 1, 3), False)]
+        stats = compute_adherence(1, checkins, date(2024, 1, 3))
+
+        assert stats["actual_completions"] == 2
+        assert stats["expected_completions"] == 3
+        assert stats["current_streak"] == 2
@@ -0,0 +1,123 @@
+import io
+import json
+import logging
+import queue
+import subprocess
+import sys
+
+import pytest
+
+from app.structured_log import (
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    SamplingFilter,
+    log_event,
+    structured_logging,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def log_output():
+    """Перенаправляет логи приложения в буфер на время теста"""
+    structured_logging.stop()
+    stream = io.StringIO()
+    structured_logging.start(stream=stream)
+    yield lambda: [json.loads(line) for line in stream.getvalue().splitlines()]
+    structured_logging.stop()
+
+
+class TestStructuredLog:
+    """Тесты структурированного логирования"""
+
+    def test_json_formatter(self):
+        """Тест: запись сериализуется в одну строку JSON с полями"""
+        record = logging.makeLogRecord(
+            {
+                "name": "app.test",
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": "login_failed",
+                "fields": {"username": "tes***"},
+            }
+        )
+        payload = json.loads(JsonFormatter().format(record))
+
+        assert payload["event"] == "login_failed"
+        assert payload["level"] == "WARNING"
+        assert payload["username"] == "tes***"
+        assert "ts" in payload
+
+    def test_sampling(self):
+        """Тест: повторы события прореживаются, пропуски подсчитываются"""
+        clock = FakeClock()
+        sampler = SamplingFilter(burst=2, window_seconds=60, clock=clock)
+
+        def record():
+            return logging.makeLogRecord({"msg": "e", "sample_key": "e"})
+
+        assert [sampler.filter(record()) for _ in range(5)] == [
+            True,
+            True,
+            False,
+            False,
+            False,
+        ]
+        assert sampler.filter(logging.makeLogRecord({"msg": "other"}))
+
+        clock.now += 60
+        passed = record()
+        assert sampler.filter(passed)
+        assert passed.suppressed == 3
+
+    def test_full_queue_drops(self):
+        """Тест: переполненная очередь не блокирует, запись отбрасывается"""
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        logger = logging.getLogger("test.full_queue")
+        logger.addHandler(handler)
+        logger.propagate = False
+
+        for _ in range(3):
+            logger.warning("event")
+
+        assert handler.queue.qsize() == 1
+        assert handler.dropped == 2
+        logger.removeHandler(handler)
+
+    def test_failed_logins_logged(self, client, log_output):
+        """Тест: неудачные логины пишутся с маскированным именем"""
+        for _ in range(3):
+            client.post("/login", json={"username": "test_user", "password": "wrong"})
+        log_event(logging.getLogger("app.test"), logging.INFO, "marker", n=1)
+        structured_logging.stop()
+
+        records = log_output()
+        failed = [r for r in records if r["event"] == "login_failed"]
+        assert len(failed) == 3
+        assert failed[0]["username"] == "tes***"
+        assert failed[0]["reason"] == "bad_password"
+        assert records[-1] == {**records[-1], "event": "marker", "n": 1}
+
+    def test_import_does_not_start_listener(self):
+        """Тест: поток записи логов запускает lifespan, а не импорт app.main"""
+        script = (
+            "import threading\n"
+            "import app.main\n"
+            "from app.structured_log import structured_logging\n"
+            "print(structured_logging.listener is None, threading.active_count())\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.split() == ["True", "1"]
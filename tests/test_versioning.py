@@ -0,0 +1,65 @@
+from app.versioning import _etag_matches
+
+
+class TestConditionalGet:
+    """Тесты ETag и условных GET-запросов"""
+
+    def test_etag_matching(self):
+        """Тест слабого сравнения ETag и списка в If-None-Match"""
+        etag = 'W/"3-abc"'
+        assert _etag_matches('W/"3-abc"', etag)
+        assert _etag_matches('"3-abc"', etag)
+        assert _etag_matches('W/"1-abc", W/"3-abc"', etag)
+        assert _etag_matches("*", etag)
+        assert not _etag_matches('W/"2-abc"', etag)
+
+    def test_get_returns_etag(self, client, auth_headers, sample_habit):
+        """Тест: GET возвращает ETag и запрещает общие кэши"""
+        response = client.get("/habits", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.headers["etag"].startswith('W/"')
+        assert response.headers["cache-control"] == "private, no-cache"
+
+    def test_not_modified(self, client, auth_headers, sample_habit):
+        """Тест: совпавший If-None-Match дает 304 без тела"""
+        url = f"/habits/{sample_habit['id']}"
+        etag = client.get(url, headers=auth_headers).headers["etag"]
+
+        response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+    def test_write_changes_etag(self, client, auth_headers, sample_habit):
+        """Тест: любая запись пользователя меняет ETag"""
+        etag = client.get("/stats", headers=auth_headers).headers["etag"]
+
+        client.put(
+            f"/habits/{sample_habit['id']}",
+            json={"name": "Новое имя", "periodicity": 1},
+            headers=auth_headers,
+        )
+        response = client.get("/stats", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+        client.post(
+            "/checkins",
+            json={
+                "habit_id": sample_habit["id"],
+                "checkin_date": "2024-01-15",
+                "completed": True,
+            },
+            headers=auth_headers,
+        )
+        newer = client.get("/stats", headers=auth_headers).headers["etag"]
+        assert newer != response.headers["etag"]
+
+    def test_etag_depends_on_query(self, client, auth_headers, sample_habit):
+        """Тест: разные страницы и фильтры имеют разные ETag"""
+        first = client.get("/habits?limit=1", headers=auth_headers)
+        second = client.get("/habits?limit=2", headers=auth_headers)
+
+        assert first.headers["etag"] != second.headers["etag"]